@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# This is free software;  you can redistribute it and/or modify it
+# under the  terms of the  GNU General Public License  as published by
+# the Free Software Foundation in version 2.  check_mk is  distributed
+# in the hope that it will be useful, but WITHOUT ANY WARRANTY;  with-
+# out even the implied warranty of  MERCHANTABILITY  or  FITNESS FOR A
+# PARTICULAR PURPOSE. See the  GNU General Public License for more de-
+# tails. You should have  received  a copy of the  GNU  General Public
+# License along with GNU Make; see the file  COPYING.  If  not,  write
+# to the Free Software Foundation, Inc., 51 Franklin St,  Fifth Floor,
+# Boston, MA 02110-1301 USA.
+
+"""
+Compare the time to merge `l1PhysIf`, `rmon*Stats` and `ethpmPhysIf` (L1) objects by rewriting DN strings
+(the previous implementation) and with `join_by_interface`, and to merge `ethpmDOM*PwrStats` (DOM) objects
+with `join_by_interface` and with the direct tx DN lookup the agent uses (`join_pwr_stats`)
+
+Usage: python3 benchmarks/bench_dn_join.py [--interfaces 100000] [--rounds 5]
+"""
+
+import argparse
+import json
+import operator
+import sys
+import time
+from os.path import join
+from typing import Any, Callable, Dict, List, Set
+
+from cmk_addons.plugins.cisco_aci.special_agents.agent_cisco_aci import DomPwrStats, ErrorCounter, InterfaceDetails, L1PhysIf, PhysIfDetails, join_by_interface, join_pwr_stats
+
+PORTS_PER_NODE: int = 48
+
+
+def build_objects(interfaces: int) -> Dict[str, List[Dict]]:
+    """synthetic objects with the fields the agent keeps, every 2nd interface has an optic (DOM stats)"""
+    objects: Dict[str, List[Dict]] = {name: [] for name in ("l1PhysIf", "rmonEtherStats", "rmonDot3Stats", "ethpmPhysIf", "ethpmDOMRxPwrStats", "ethpmDOMTxPwrStats")}
+    for i in range(interfaces):
+        dn = "topology/pod-%d/node-%d/sys/phys-[eth1/%d]" % (1 + i // 20000, 101 + i // PORTS_PER_NODE, 1 + i % PORTS_PER_NODE)
+        objects["l1PhysIf"].append({"dn": dn, "id": "eth1/%d" % (1 + i % PORTS_PER_NODE), "adminSt": "up", "layer": "Layer2"})
+        objects["rmonEtherStats"].append({"dn": dn + "/dbgEtherStats", "cRCAlignErrors": str(i % 7)})
+        objects["rmonDot3Stats"].append({"dn": dn + "/dbgDot3Stats", "fCSErrors": str(i % 5)})
+        objects["ethpmPhysIf"].append({"dn": dn + "/phys", "operSt": "up", "operSpeed": "10G"})
+        if i % 2:
+            for kind, aci_class in (("rxpower", "ethpmDOMRxPwrStats"), ("txpower", "ethpmDOMTxPwrStats")):
+                objects[aci_class].append({"dn": dn + "/phys/domstats/" + kind, "alert": "none", "status": "", "hiAlarm": "5.0", "hiWarn": "4.0", "loAlarm": "-13.0", "loWarn": "-11.0", "value": "-2.5"})
+    return objects
+
+
+def build_records(objects: Dict[str, List[Dict]]) -> Dict[str, List[Any]]:
+    """the L1 objects as the records the agent keeps (built while decoding, so not part of the measured merge)"""
+    return {
+        **objects,
+        "l1PhysIf": [L1PhysIf.from_attributes(obj) for obj in objects["l1PhysIf"]],
+        "rmonEtherStats": [ErrorCounter.crc_errors(obj) for obj in objects["rmonEtherStats"]],
+        "rmonDot3Stats": [ErrorCounter.fcs_errors(obj) for obj in objects["rmonDot3Stats"]],
+        "ethpmPhysIf": [PhysIfDetails.from_attributes(obj) for obj in objects["ethpmPhysIf"]],
+    }
+
+
+def merge_l1_strings(objects: Dict[str, List[Dict]]) -> List[InterfaceDetails]:
+    """the previous implementation: filter_stats, _strip_dn, _parent_dn and PhysicalInterfaces._build_dn"""
+    phys_iface_dn: Set = {iface["dn"] for iface in objects["l1PhysIf"]}
+    ether_stats = {stats["dn"]: stats for stats in objects["rmonEtherStats"] if stats["dn"].replace("dbgEtherStats", "").strip("/") in phys_iface_dn}
+    dot3_stats = {stats["dn"]: stats for stats in objects["rmonDot3Stats"] if stats["dn"].replace("dbgDot3Stats", "").strip("/") in phys_iface_dn}
+    details = {iface["dn"]: iface for iface in objects["ethpmPhysIf"] if iface["dn"].rsplit("/", 1)[0] in phys_iface_dn}
+
+    merged: List[InterfaceDetails] = []
+    for iface in objects["l1PhysIf"]:
+        iface_details = details.get(join(iface["dn"], "phys"), {})
+        merged.append(
+            InterfaceDetails(
+                dn=iface["dn"],
+                id=iface["id"],
+                admin_state=iface["adminSt"],
+                layer=iface["layer"],
+                crc_errors=ether_stats.get(join(iface["dn"], "dbgEtherStats"), {}).get("cRCAlignErrors"),
+                fcs_errors=dot3_stats.get(join(iface["dn"], "dbgDot3Stats"), {}).get("fCSErrors"),
+                op_state=iface_details.get("operSt"),
+                op_speed=iface_details.get("operSpeed"),
+            )
+        )
+    return merged
+
+
+def merge_l1_join(objects: Dict[str, List[Any]]) -> List[InterfaceDetails]:
+    joined = join_by_interface(objects["l1PhysIf"], objects["rmonEtherStats"], objects["rmonDot3Stats"], objects["ethpmPhysIf"], dn=operator.attrgetter("dn"))
+    return [InterfaceDetails.get_interface_details(*interface) for interface in joined]
+
+
+def merge_dom_strings(objects: Dict[str, List[Dict]]) -> List[DomPwrStats]:
+    """the tx DN is built from the rx DN (`join_pwr_stats`, the agent's implementation)"""
+    return [DomPwrStats.get_pwr_stats(rx, tx) for rx, tx in join_pwr_stats(objects["ethpmDOMRxPwrStats"], objects["ethpmDOMTxPwrStats"])]
+
+
+def merge_dom_join(objects: Dict[str, List[Dict]]) -> List[DomPwrStats]:
+    return [DomPwrStats.get_pwr_stats(rx, tx or {}) for rx, tx in join_by_interface(objects["ethpmDOMRxPwrStats"], objects["ethpmDOMTxPwrStats"])]
+
+
+def measure(merge: Callable[[Dict[str, List[Any]]], List], objects: Dict[str, List[Any]], rounds: int) -> float:
+    """best of `rounds`"""
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        merge(objects)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--interfaces", type=int, default=100000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    objects = build_objects(args.interfaces)
+    records = build_records(objects)
+
+    for merge_strings, merge_join in ((merge_l1_strings, merge_l1_join), (merge_dom_strings, merge_dom_join)):
+        # both implementations have to produce the same result
+        assert merge_strings(objects) == merge_join(records)
+
+        for variant, merge, data in (("strings", merge_strings, objects), ("join", merge_join, records)):
+            print(json.dumps({"merge": merge.__name__, "variant": variant, "interfaces": args.interfaces, "seconds": round(measure(merge, data, args.rounds), 3)}))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# This is free software;  you can redistribute it and/or modify it
+# under the  terms of the  GNU General Public License  as published by
+# the Free Software Foundation in version 2.  check_mk is  distributed
+# in the hope that it will be useful, but WITHOUT ANY WARRANTY;  with-
+# out even the implied warranty of  MERCHANTABILITY  or  FITNESS FOR A
+# PARTICULAR PURPOSE. See the  GNU General Public License for more de-
+# tails. You should have  received  a copy of the  GNU  General Public
+# License along with GNU Make; see the file  COPYING.  If  not,  write
+# to the Free Software Foundation, Inc., 51 Franklin St,  Fifth Floor,
+# Boston, MA 02110-1301 USA.
+
+"""
+Compare peak RSS of decoding a large `faultInst` response with `response.json()` and with `ImdataStream`
+
+Every variant runs in its own process, as the peak RSS of a process never decreases.
+
+Usage: python3 benchmarks/bench_imdata_stream.py [--objects 100000]
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+from cmk_addons.plugins.cisco_aci.special_agents.agent_cisco_aci import FAULT_INST_FIELDS, ImdataStream, _select_fields
+
+
+def write_response(path: str, objects: int) -> None:
+    """write a synthetic faultInst class query response with the attribute sprawl of a real APIC"""
+    with open(path, "w") as f:
+        f.write(f'{{"totalCount":"{objects}","imdata":[')
+        for i in range(objects):
+            attributes = {
+                "ack": "no",
+                "cause": "threshold-crossed",
+                "changeSet": "crcLast:%d" % i,
+                "childAction": "",
+                "code": "F%06d" % (i % 1000),
+                "created": "2024-01-01T00:00:00.000+01:00",
+                "delegated": "no",
+                "descr": "TCA: CRC Align Errors current value for topology/pod-1/node-%d/sys/phys-[eth1/%d] is above threshold" % (101 + i // 48, i % 48),
+                "dn": "topology/pod-1/node-%d/sys/phys-[eth1/%d]/fault-F%06d" % (101 + i // 48, i % 48, i % 1000),
+                "domain": "infra",
+                "highestSeverity": "major",
+                "lastTransition": "2024-01-01T00:00:00.000+01:00",
+                "lc": "raised",
+                "occur": "1",
+                "origSeverity": "major",
+                "prevSeverity": "major",
+                "rule": "tca-rmon-ether-stats-crc-align-errors",
+                "severity": "major",
+                "status": "",
+                "subject": "counter",
+                "type": "operational",
+            }
+            f.write(("," if i else "") + json.dumps({"faultInst": {"attributes": attributes}}))
+        f.write("]}")
+
+
+def response_from_file(path: str) -> requests.Response:
+    response = requests.models.Response()
+    response.status_code = 200
+    response.encoding = "utf-8"
+    response.raw = open(path, "rb")
+    return response
+
+
+def run_variant(variant: str, path: str) -> None:
+    start = time.time()
+
+    if variant == "json":
+        # the previous implementation of Apic.get_data_from_class
+        imdata = response_from_file(path).json()["imdata"]
+        result = [item["faultInst"]["attributes"] for item in imdata]
+    else:
+        result = [_select_fields(item["faultInst"]["attributes"], FAULT_INST_FIELDS) for item in ImdataStream(response_from_file(path))]
+
+    elapsed = time.time() - start
+    peak_kib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({"variant": variant, "objects": len(result), "seconds": round(elapsed, 2), "peak_rss_mib": round(peak_kib / 1024, 1)}))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--objects", type=int, default=100000)
+    parser.add_argument("--variant", choices=("json", "stream"), help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.variant:
+        run_variant(args.variant, args.path)
+        return 0
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "faultInst.json")
+        write_response(path, args.objects)
+        print(f"response size: {os.path.getsize(path) / 1024 / 1024:.1f} MiB")
+
+        for variant in ("json", "stream"):
+            subprocess.run([sys.executable, __file__, "--variant", variant, "--path", path], check=True)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# This is free software;  you can redistribute it and/or modify it
+# under the  terms of the  GNU General Public License  as published by
+# the Free Software Foundation in version 2.  check_mk is  distributed
+# in the hope that it will be useful, but WITHOUT ANY WARRANTY;  with-
+# out even the implied warranty of  MERCHANTABILITY  or  FITNESS FOR A
+# PARTICULAR PURPOSE. See the  GNU General Public License for more de-
+# tails. You should have  received  a copy of the  GNU  General Public
+# License along with GNU Make; see the file  COPYING.  If  not,  write
+# to the Free Software Foundation, Inc., 51 Franklin St,  Fifth Floor,
+# Boston, MA 02110-1301 USA.
+
+"""
+Compare the memory held by the collected `l1PhysIf`, `rmon*Stats` and `ethpmPhysIf` objects
+kept as projected attribute dicts (the previous implementation) and as interned slot records
+
+The memory is measured with tracemalloc while the objects are decoded from a response with `ImdataStream`,
+every variant runs in its own process.
+
+Usage: python3 benchmarks/bench_interface_model.py [--interfaces 100000]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+import requests
+
+from cmk_addons.plugins.cisco_aci.special_agents.agent_cisco_aci import ErrorCounter, ImdataStream, L1PhysIf, PhysIfDetails, _select_fields
+
+PORTS_PER_NODE: int = 48
+
+# class, the fields of the previous implementation, record
+CLASSES: List = [
+    ("l1PhysIf", ("dn", "id", "adminSt", "layer"), L1PhysIf.from_attributes),
+    ("rmonEtherStats", ("dn", "cRCAlignErrors"), ErrorCounter.crc_errors),
+    ("rmonDot3Stats", ("dn", "fCSErrors"), ErrorCounter.fcs_errors),
+    ("ethpmPhysIf", ("dn", "operSt", "operSpeed"), PhysIfDetails.from_attributes),
+]
+
+
+def write_responses(tmpdir: str, interfaces: int) -> None:
+    """write synthetic class query responses with a part of the attribute sprawl of a real APIC"""
+    for aci_class, _fields, _record in CLASSES:
+        with open(os.path.join(tmpdir, f"{aci_class}.json"), "w") as f:
+            f.write(f'{{"totalCount":"{interfaces}","imdata":[')
+            for i in range(interfaces):
+                dn = "topology/pod-1/node-%d/sys/phys-[eth1/%d]" % (101 + i // PORTS_PER_NODE, 1 + i % PORTS_PER_NODE)
+                attributes: Dict[str, str] = {"childAction": "", "modTs": "2024-01-01T00:00:00.000+01:00", "status": ""}
+                if aci_class == "l1PhysIf":
+                    attributes.update(dn=dn, id="eth1/%d" % (1 + i % PORTS_PER_NODE), adminSt="up", layer="Layer2", descr="", mtu="9216", speed="inherit")
+                elif aci_class == "rmonEtherStats":
+                    attributes.update(dn=dn + "/dbgEtherStats", cRCAlignErrors=str(i % 3), collisions="0", dropEvents="0", octets=str(i * 1000))
+                elif aci_class == "rmonDot3Stats":
+                    attributes.update(dn=dn + "/dbgDot3Stats", fCSErrors=str(i % 3), alignmentErrors="0", lateCollisions="0")
+                else:
+                    attributes.update(dn=dn + "/phys", operSt="up", operSpeed="10G", operDuplex="full", operMode="trunk")
+                f.write(("," if i else "") + json.dumps({aci_class: {"attributes": attributes}}))
+            f.write("]}")
+
+
+def response_from_file(path: str) -> requests.Response:
+    response = requests.models.Response()
+    response.status_code = 200
+    response.encoding = "utf-8"
+    response.raw = open(path, "rb")
+    return response
+
+
+def run_variant(variant: str, tmpdir: str) -> None:
+    start = time.time()
+    tracemalloc.start()
+
+    collected: Dict[str, List[Any]] = {}
+    for aci_class, fields, record in CLASSES:
+        project: Callable[[Dict], Any] = record if variant == "records" else lambda attributes, fields=fields: _select_fields(attributes, fields)
+        collected[aci_class] = [project(item[aci_class]["attributes"]) for item in ImdataStream(response_from_file(os.path.join(tmpdir, f"{aci_class}.json")))]
+
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    elapsed = time.time() - start
+    objects = sum(len(objects) for objects in collected.values())
+    print(json.dumps({"variant": variant, "objects": objects, "seconds": round(elapsed, 2), "held_mib": round(held / 1024 / 1024, 1), "peak_mib": round(peak / 1024 / 1024, 1)}))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--interfaces", type=int, default=100000)
+    parser.add_argument("--variant", choices=("dicts", "records"), help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.variant:
+        run_variant(args.variant, args.path)
+        return 0
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        write_responses(tmpdir, args.interfaces)
+
+        for variant in ("dicts", "records"):
+            subprocess.run([sys.executable, __file__, "--variant", variant, "--path", tmpdir], check=True)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
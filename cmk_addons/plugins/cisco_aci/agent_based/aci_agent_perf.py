@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8; py-indent-offset: 4 -*-
+
+# This is free software;  you can redistribute it and/or modify it
+# under the  terms of the  GNU General Public License  as published by
+# the Free Software Foundation in version 2.  check_mk is  distributed
+# in the hope that it will be useful, but WITHOUT ANY WARRANTY;  with-
+# out even the implied warranty of  MERCHANTABILITY  or  FITNESS FOR A
+# PARTICULAR PURPOSE. See the  GNU General Public License for more de-
+# tails. You should have  received  a copy of the  GNU  General Public
+# License along with GNU Make; see the file  COPYING.  If  not,  write
+# to the Free Software Foundation, Inc., 51 Franklin St,  Fifth Floor,
+# Boston, MA 02110-1301 USA.
+
+"""
+Check_MK agent based checks to be used with agent_cisco_aci Datasource
+
+Authors:    Roger Ellenberger <roger.ellenberger@wagner.ch>
+
+"""
+
+from __future__ import annotations
+
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+from cmk.agent_based.v2 import (
+    AgentSection,
+    CheckPlugin,
+    CheckResult,
+    DiscoveryResult,
+    check_levels,
+    Metric,
+    Result,
+    Service,
+    State,
+    render,
+)
+from .aci_general import AgentPerfLevels
+
+
+DEFAULT_AGENT_PERF_LEVELS: Dict = {"runtime_levels": {"warn": 45.0, "crit": 55.0}}
+
+
+class SectionPerf(NamedTuple):
+    name: str
+    state: str
+    seconds: float
+    requests: int
+    response_bytes: int
+    objects: int
+    retries: int
+    errors: int
+    detail: str = ""  # e.g. why the section was skipped
+
+    @staticmethod
+    def from_string_table_line(line: List[str]) -> SectionPerf:
+        _, name, state, seconds, *counts = line[:9]
+        return SectionPerf(name, state, float(seconds), *map(int, counts), *line[9:10])
+
+
+class Concurrency(NamedTuple):
+    limit: int
+    peak: int
+    decreases: int
+
+
+class ControllerStats(NamedTuple):
+    url: str
+    requests: int
+    connections: int
+
+
+class AgentPerf(NamedTuple):
+    login_seconds: float
+    runtime: float
+    sections: List[SectionPerf]
+    concurrency: Optional[Concurrency] = None
+    controllers: Sequence[ControllerStats] = ()
+
+    def total(self, counter: str) -> int:
+        return sum(getattr(section, counter) for section in self.sections)
+
+    def in_state(self, state: str) -> str:
+        """the sections in the state, with their details"""
+        return ", ".join(f"{section.name} ({section.detail})" if section.detail else section.name for section in self.sections if section.state == state)
+
+
+def parse_aci_agent_perf(string_table) -> AgentPerf:
+    """
+    Example output:
+        login 0.099
+        section aci_version ok 0.059 1 3863 20 0 0
+        section aci_l1_phys_if ok 0.183 4 219696 1152 0 0
+        section aci_dom_pwr_stats skipped 0.000 0 0 0 0 0 depends on aci_nodes
+        concurrency 8 16 1
+        controller https://10.1.1.1/api/ 7 2
+        runtime 0.400
+    """
+    login_seconds, runtime = 0.0, 0.0
+    sections: List[SectionPerf] = []
+    concurrency: Optional[Concurrency] = None
+    controllers: List[ControllerStats] = []
+
+    for line in string_table:
+        if line[0] == "login":
+            login_seconds = float(line[1])
+        elif line[0] == "runtime":
+            runtime = float(line[1])
+        elif line[0] == "section":
+            sections.append(SectionPerf.from_string_table_line(line))
+        elif line[0] == "concurrency":
+            concurrency = Concurrency(*map(int, line[1:4]))
+        elif line[0] == "controller":
+            controllers.append(ControllerStats(line[1], int(line[2]), int(line[3])))
+
+    return AgentPerf(login_seconds, runtime, sections, concurrency, tuple(controllers))
+
+
+def discover_aci_agent_perf(section: AgentPerf) -> DiscoveryResult:
+    yield Service()
+
+
+def check_aci_agent_perf(params: Dict, section: AgentPerf) -> CheckResult:
+    levels = AgentPerfLevels.model_validate(params)
+
+    yield from check_levels(
+        section.runtime,
+        levels_upper=levels.runtime_levels.get_cmk_levels(),
+        metric_name="aci_agent_runtime",
+        render_func=render.timespan,
+        label="Runtime",
+    )
+    yield from check_levels(section.login_seconds, metric_name="aci_agent_login_time", render_func=render.timespan, label="Login")
+
+    # a skipped section is missing in this run, a stale one is written with the result of an earlier run
+    if skipped := section.in_state("skipped"):
+        yield Result(state=State.WARN, summary=f"Skipped sections: {skipped}")
+    if stale := section.in_state("stale"):
+        yield Result(state=State.OK, summary=f"Stale sections: {stale}")
+
+    if section.sections:
+        slowest = max(section.sections, key=lambda section_perf: section_perf.seconds)
+        yield Result(state=State.OK, summary=f"Slowest section: {slowest.name} ({render.timespan(slowest.seconds)})")
+
+    yield Result(state=State.OK, summary=f"Requests: {section.total('requests')}, Response size: {render.bytes(section.total('response_bytes'))}")
+    yield Result(state=State.OK, notice=f"Objects: {section.total('objects')}, Retries: {section.total('retries')}, Errors: {section.total('errors')}")
+
+    for section_perf in section.sections:
+        yield Result(
+            state=State.OK,
+            notice=f"{section_perf.name} ({section_perf.state}): {render.timespan(section_perf.seconds)}, "
+            f"{section_perf.requests} requests, {render.bytes(section_perf.response_bytes)}, {section_perf.objects} objects, "
+            f"{section_perf.retries} retries, {section_perf.errors} errors" + (f", {section_perf.detail}" if section_perf.detail else ""),
+        )
+
+    if section.concurrency:
+        concurrency = section.concurrency
+        yield Result(state=State.OK, notice=f"Requests in flight: limit {concurrency.limit}, peak {concurrency.peak}, {concurrency.decreases} decreases on congestion")
+
+    for controller in section.controllers:
+        yield Result(state=State.OK, notice=f"{controller.url}: {controller.requests} requests over {controller.connections} connections")
+
+    yield Metric("aci_agent_requests", section.total("requests"))
+    yield Metric("aci_agent_response_bytes", section.total("response_bytes"))
+    yield Metric("aci_agent_objects", section.total("objects"))
+    yield Metric("aci_agent_retries", section.total("retries"))
+    yield Metric("aci_agent_errors", section.total("errors"))
+
+
+agent_section_cisco_aci_agent_perf = AgentSection(
+    name="aci_agent_perf",
+    parse_function=parse_aci_agent_perf,
+)
+
+check_plugin_cisco_aci_agent_perf = CheckPlugin(
+    name="aci_agent_perf",
+    service_name="Cisco ACI agent performance",
+    discovery_function=discover_aci_agent_perf,
+    check_function=check_aci_agent_perf,
+    check_ruleset_name="aci_agent_perf_levels",
+    sections=["aci_agent_perf"],
+    check_default_parameters=DEFAULT_AGENT_PERF_LEVELS,
+)
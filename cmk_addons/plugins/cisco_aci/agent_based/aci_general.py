@@ -64,6 +64,10 @@ class HealthLevels(BaseModel):
     health_levels: ErrorLevels = Field(default_factory=ErrorLevels)
 
 
+class AgentPerfLevels(BaseModel):
+    runtime_levels: ErrorLevels = Field(default_factory=ErrorLevels)
+
+
 def convert_rate(value: float, factor: ConversionFactor = ConversionFactor.MINUTES) -> float:
     """convert values from x/second into other rate. Default converts into x/min."""
     return value * factor.value
@@ -102,6 +102,15 @@ class ErrorRates(NamedTuple):
         return self._check_state(params, state=State.WARN)
 
 
+def _counter_rate(value_store, key: str, now: float, value: int) -> float:
+    """rate of an error counter in x/second
+
+    a missing counter is stored as zero, so a counter which shows up for the first time gives the rate of all its errors
+    since the last check. A counter which went back (cleared on the switch) gives rate zero instead of a negative rate.
+    """
+    return max(get_rate(value_store, key, now, value), 0.0)
+
+
 @dataclass
 class AciL1Interface:
     dn: str
@@ -123,9 +132,9 @@ class AciL1Interface:
             value_store = get_value_store()
             now = time.time()
 
-            crc_rate = convert_rate(get_rate(value_store, f"cisco_aci.{self.dn}.crc", now, self.crc_errors))
+            crc_rate = convert_rate(_counter_rate(value_store, f"cisco_aci.{self.dn}.crc", now, self.crc_errors))
 
-            fcs_rate = convert_rate(get_rate(value_store, f"cisco_aci.{self.dn}.fcs", now, self.fcs_errors))
+            fcs_rate = convert_rate(_counter_rate(value_store, f"cisco_aci.{self.dn}.fcs", now, self.fcs_errors))
 
             stomped_crc_rate = crc_rate - fcs_rate
 
@@ -135,10 +144,15 @@ class AciL1Interface:
 
         return self.rates
 
+    @staticmethod
+    def _parse_counter(value: str) -> int:
+        """the agent writes `None` (or `0` if it collects only non-zero counters) for interfaces without error counter"""
+        return int(value) if value.isdigit() else 0
+
     @staticmethod
     def from_string_table(line: Sequence[str]) -> AciL1Interface:
-        line[4] = int(line[4]) if line[4].isdigit() else 0
-        line[5] = int(line[5]) if line[5].isdigit() else 0
+        line[4] = AciL1Interface._parse_counter(line[4])
+        line[5] = AciL1Interface._parse_counter(line[5])
 
         return AciL1Interface(*line)
 
@@ -16,10 +16,12 @@
 Graph definitions for Cisco ACI
 """
 
-from cmk.graphing.v1 import metrics, Title
+from cmk.graphing.v1 import graphs, metrics, Title
 
 COUNT = metrics.Unit(metrics.DecimalNotation(""))
 DBM = metrics.Unit(metrics.DecimalNotation("dbm"))
+SECONDS = metrics.Unit(metrics.TimeNotation())
+BYTES = metrics.Unit(metrics.IECNotation("B"))
 
 
 metric_cisco_aci_health = metrics.Metric(
@@ -84,3 +86,73 @@ metric_cisco_aci_bgp_conn_est = metrics.Metric(
     unit=COUNT,
     color=metrics.Color.BLUE,
 )
+
+metric_cisco_aci_agent_runtime = metrics.Metric(
+    name="aci_agent_runtime",
+    title=Title("Agent runtime"),
+    unit=SECONDS,
+    color=metrics.Color.BLUE,
+)
+
+metric_cisco_aci_agent_login_time = metrics.Metric(
+    name="aci_agent_login_time",
+    title=Title("Agent login time"),
+    unit=SECONDS,
+    color=metrics.Color.LIGHT_BLUE,
+)
+
+metric_cisco_aci_agent_requests = metrics.Metric(
+    name="aci_agent_requests",
+    title=Title("Agent requests"),
+    unit=COUNT,
+    color=metrics.Color.GREEN,
+)
+
+metric_cisco_aci_agent_response_bytes = metrics.Metric(
+    name="aci_agent_response_bytes",
+    title=Title("Agent response size"),
+    unit=BYTES,
+    color=metrics.Color.CYAN,
+)
+
+metric_cisco_aci_agent_objects = metrics.Metric(
+    name="aci_agent_objects",
+    title=Title("Agent objects"),
+    unit=COUNT,
+    color=metrics.Color.PURPLE,
+)
+
+metric_cisco_aci_agent_retries = metrics.Metric(
+    name="aci_agent_retries",
+    title=Title("Agent retries"),
+    unit=COUNT,
+    color=metrics.Color.ORANGE,
+)
+
+metric_cisco_aci_agent_errors = metrics.Metric(
+    name="aci_agent_errors",
+    title=Title("Agent errors"),
+    unit=COUNT,
+    color=metrics.Color.RED,
+)
+
+graph_cisco_aci_agent_runtime = graphs.Graph(
+    name="aci_agent_runtime",
+    title=Title("Cisco ACI agent runtime"),
+    compound_lines=["aci_agent_runtime"],
+    simple_lines=[
+        "aci_agent_login_time",
+        metrics.WarningOf("aci_agent_runtime"),
+        metrics.CriticalOf("aci_agent_runtime"),
+    ],
+)
+
+graph_cisco_aci_agent_requests = graphs.Graph(
+    name="aci_agent_requests",
+    title=Title("Cisco ACI agent requests"),
+    simple_lines=[
+        "aci_agent_requests",
+        "aci_agent_retries",
+        "aci_agent_errors",
+    ],
+)
@@ -62,3 +62,9 @@ perfometer_cisco_aci_l1_errors = Bidirectional(
     ),
 )
 
+
+perfometer_cisco_aci_agent_runtime = Perfometer(
+    name="aci_agent_runtime",
+    focus_range=FocusRange(lower=Closed(0), upper=Open(60)),
+    segments=["aci_agent_runtime"],
+)
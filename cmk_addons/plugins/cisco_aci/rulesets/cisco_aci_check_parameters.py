@@ -27,7 +27,7 @@ from cmk.rulesets.v1.form_specs import (
     DictElement,
     DefaultValue,
 )
-from cmk.rulesets.v1.rule_specs import CheckParameters, Topic, HostAndItemCondition
+from cmk.rulesets.v1.rule_specs import CheckParameters, Topic, HostAndItemCondition, HostCondition
 
 
 def _form_spec_aci_l1_phys_if_levels():
@@ -271,3 +271,54 @@ rule_spec_aci_bgp_peer_entry_levels = CheckParameters(
     condition=HostAndItemCondition(Title("Cisco ACI BGP peer entry settings")),
     parameter_form=_form_spec_aci_bgp_peer_entry_levels,
 )
+
+
+def _form_spec_aci_agent_perf_levels():
+    return Dictionary(
+        title=Title("Configure Cisco ACI agent performance check parameters"),
+        help_text=Help(
+            'The data for this check is written by the datasource program "Cisco ACI"'
+            ' about its own run.'
+        ),
+        elements={
+            'runtime_levels': DictElement(
+                required=False,
+                parameter_form=Dictionary(
+                    title=Title("Agent runtime"),
+                    help_text=Help(
+                        "An alert will be raised if a run of the agent takes longer than the "
+                        "configured number of seconds. Keep the levels below the check interval "
+                        "of the Cisco ACI host, so the alert is raised before the agent runs "
+                        "into the next check interval."
+                    ),
+                    elements={
+                        "warn": DictElement(
+                            required=True,
+                            parameter_form=Float(
+                                title=Title("Warning at"),
+                                unit_symbol="s",
+                                prefill=DefaultValue(45.0),
+                            ),
+                        ),
+                        "crit": DictElement(
+                            required=True,
+                            parameter_form=Float(
+                                title=Title("Critical at"),
+                                unit_symbol="s",
+                                prefill=DefaultValue(55.0),
+                            ),
+                        ),
+                    },
+                ),
+            ),
+        },
+    )
+
+
+rule_spec_aci_agent_perf_levels = CheckParameters(
+    title=Title("Cisco ACI agent performance"),
+    name="aci_agent_perf_levels",
+    topic=Topic.NETWORKING,
+    condition=HostCondition(),
+    parameter_form=_form_spec_aci_agent_perf_levels,
+)
@@ -28,9 +28,16 @@ from cmk.rulesets.v1.form_specs import (
     MultipleChoiceElement,
     MultipleChoice,
     Password,
+    SingleChoice,
+    SingleChoiceElement,
     String,
     DictElement,
+    DefaultValue,
+    Integer,
+    TimeMagnitude,
+    TimeSpan,
 )
+from cmk.rulesets.v1.form_specs.validators import NumberInRange
 from cmk.rulesets.v1.rule_specs import SpecialAgent, Topic
 
 
@@ -41,6 +48,36 @@ RAW_ACI_Features: Final = [
     MultipleChoiceElement(name="aci_dom_pwr_stats", title=Title("ACI DOM Power Stats")),
 ]
 
+IFACE_DETAILS_MODES: Final = [
+    SingleChoiceElement(name="per_class", title=Title("One fabric wide ethpmPhysIf class query")),
+    SingleChoiceElement(name="per_node", title=Title("One ethpmPhysIf class query per node")),
+    SingleChoiceElement(name="per_interface", title=Title("One request per interface (legacy)")),
+]
+
+LOAD_BALANCE_MODES: Final = [
+    SingleChoiceElement(name="failover", title=Title("Use the first reachable APIC only (failover)")),
+    SingleChoiceElement(name="round_robin", title=Title("Spread requests over all reachable APICs in turn (round robin)")),
+    SingleChoiceElement(name="least_outstanding", title=Title("Send requests to the APIC with the fewest requests in flight")),
+]
+
+
+def _section_cache_ttl(title: Title) -> TimeSpan:
+    return TimeSpan(
+        title=title,
+        displayed_magnitudes=[TimeMagnitude.HOUR, TimeMagnitude.MINUTE],
+        prefill=DefaultValue(3600.0),
+        custom_validate=(NumberInRange(min_value=60),),
+    )
+
+
+def _section_budget(title: Title) -> TimeSpan:
+    return TimeSpan(
+        title=title,
+        displayed_magnitudes=[TimeMagnitude.SECOND],
+        prefill=DefaultValue(20.0),
+        custom_validate=(NumberInRange(min_value=1),),
+    )
+
 
 def _valuespec_special_agent_cisco_aci() -> Dictionary:
     return Dictionary(
@@ -63,12 +100,36 @@ def _valuespec_special_agent_cisco_aci() -> Dictionary:
                 ),
             ),
             "password": DictElement(
-                required=True,
+                required=False,
                 parameter_form=Password(
                     title=Title("Password"),
+                    help_text=Help("Required unless a user certificate is configured."),
                     #migrate=migrate_to_password,
                 ),
             ),
+            "certificate": DictElement(
+                parameter_form=Dictionary(
+                    title=Title("Authenticate with a user certificate"),
+                    help_text=Help("Sign every request with the private key of an X.509 certificate configured for the ACI user, "
+                                   "instead of logging in with the password. No login request and no APIC session is needed."),
+                    elements={
+                        "cert_name": DictElement(
+                            required=True,
+                            parameter_form=String(
+                                title=Title("Certificate name"),
+                                help_text=Help("Name of the certificate in the ACI user configuration."),
+                            ),
+                        ),
+                        "private_key": DictElement(
+                            required=True,
+                            parameter_form=String(
+                                title=Title("Private key file"),
+                                help_text=Help("Path of the PEM encoded private key on the Checkmk server, readable by the site user."),
+                            ),
+                        ),
+                    },
+                ),
+            ),
             "dns_domain": DictElement(
                 required=True,
                 parameter_form=String(
@@ -83,6 +144,130 @@ def _valuespec_special_agent_cisco_aci() -> Dictionary:
                     help_text=Help("Discovers only Interfaces who are not admin down."),
                 ),
             ),
+            "skip_cleared_faults": DictElement(
+                parameter_form=BooleanChoice(
+                    title=Title("Skip cleared faults"),
+                    help_text=Help("Let the APIC send only faults which are not cleared. This reduces the size of the fault query a lot, "
+                                   "but the ACI Faults service does not count the cleared alarms anymore."),
+                ),
+            ),
+            "only_nonzero_counters": DictElement(
+                parameter_form=BooleanChoice(
+                    title=Title("Collect only non-zero interface error counters"),
+                    help_text=Help("Let the APIC send only the CRC and FCS error counters which are not zero. On a healthy fabric this shrinks "
+                                   "the two largest queries a lot. Interfaces without such a counter are reported with zero errors."),
+                ),
+            ),
+            "iface_details_mode": DictElement(
+                parameter_form=SingleChoice(
+                    title=Title("Collection of interface details"),
+                    help_text=Help("Defines how the operational state and speed of the interfaces (ethpmPhysIf) is collected. "
+                                   "Class queries need a small, fixed number of requests instead of one request per interface."),
+                    elements=IFACE_DETAILS_MODES,
+                    prefill=DefaultValue("per_class"),
+                ),
+            ),
+            "shard_by_node": DictElement(
+                parameter_form=BooleanChoice(
+                    title=Title("Query interfaces per switch node"),
+                    help_text=Help("Query the interfaces, their error counters and the DOM power stats with one query per switch node, "
+                                   "instead of fabric wide class queries. The APIC then builds many small responses instead of a few huge ones."),
+                ),
+            ),
+            "load_balance": DictElement(
+                parameter_form=SingleChoice(
+                    title=Title("Distribution of requests over the APICs"),
+                    help_text=Help("With multiple APIC IP addresses, log into all reachable controllers and spread the read requests over them, "
+                                   "instead of sending all requests to the first reachable controller. Unreachable controllers are skipped."),
+                    elements=LOAD_BALANCE_MODES,
+                    prefill=DefaultValue("failover"),
+                ),
+            ),
+            "max_concurrency": DictElement(
+                parameter_form=Integer(
+                    title=Title("Maximum number of concurrent requests"),
+                    help_text=Help("Upper limit of requests in flight to the APIC. The agent starts with a few concurrent requests and raises their number "
+                                   "as long as the latency of the APIC stays flat, it backs off on rising latency and on 429/503 responses."),
+                    prefill=DefaultValue(50),
+                    custom_validate=(NumberInRange(min_value=1),),
+                ),
+            ),
+            "max_retries": DictElement(
+                parameter_form=Integer(
+                    title=Title("Retries of failed requests"),
+                    help_text=Help("Repeat a request after a connection error, a timeout or a 429/5xx response of the APIC, with an exponentially growing delay "
+                                   "(or the delay asked for by the APIC). No retry is done past the deadline of the agent run."),
+                    prefill=DefaultValue(3),
+                    custom_validate=(NumberInRange(min_value=0, max_value=10),),
+                ),
+            ),
+            "page_size": DictElement(
+                parameter_form=Integer(
+                    title=Title("Page size of class queries"),
+                    help_text=Help("Fetch large classes (like faultInst or l1PhysIf) in pages of this many objects. "
+                                   "The remaining pages are fetched concurrently once the first page reports the total count."),
+                    prefill=DefaultValue(10000),
+                    custom_validate=(NumberInRange(min_value=1),),
+                ),
+            ),
+            "stream_json": DictElement(
+                parameter_form=BooleanChoice(
+                    title=Title("Decode class queries incrementally"),
+                    help_text=Help("Decode the responses of class queries while they are downloaded and keep only the needed attributes. "
+                                   "This bounds the memory usage of the special agent for large classes like faultInst or rmonEtherStats."),
+                ),
+            ),
+            "section_cache_ttls": DictElement(
+                parameter_form=Dictionary(
+                    title=Title("Cache slowly changing sections"),
+                    help_text=Help("Reuse the data of these sections for the configured time instead of fetching it from the APIC in every run. "
+                                   "The sections are marked as cached, so Checkmk shows the age of the data."),
+                    elements={
+                        "aci_version": DictElement(parameter_form=_section_cache_ttl(Title("Software versions (firmwareRunning)"))),
+                        "aci_tenants": DictElement(parameter_form=_section_cache_ttl(Title("Tenants"))),
+                        "aci_nodes": DictElement(parameter_form=_section_cache_ttl(Title("Node inventory (topSystem, eqptCh)"))),
+                    },
+                ),
+            ),
+            "stale_max_age": DictElement(
+                parameter_form=TimeSpan(
+                    title=Title("Use stale data of failing sections"),
+                    help_text=Help("Keep the data of every section. If a section can not be fetched from the APIC, write its last data "
+                                   "(if not older than this) marked as cached with its real age, instead of failing the whole agent. "
+                                   "Sections without such data, and the sections depending on them, are skipped."),
+                    displayed_magnitudes=[TimeMagnitude.HOUR, TimeMagnitude.MINUTE],
+                    prefill=DefaultValue(1800.0),
+                    custom_validate=(NumberInRange(min_value=60),),
+                ),
+            ),
+            "deadline": DictElement(
+                parameter_form=TimeSpan(
+                    title=Title("Deadline of the agent run"),
+                    help_text=Help("Time the special agent may take for the whole run. The deadline is enforced on every request to the APIC. "
+                                   "Sections which are not done in time are written with stale data (if configured) or skipped, the other sections are still written. "
+                                   "Keep it below the check interval."),
+                    displayed_magnitudes=[TimeMagnitude.SECOND],
+                    prefill=DefaultValue(50.0),
+                    custom_validate=(NumberInRange(min_value=1),),
+                ),
+            ),
+            "section_budgets": DictElement(
+                parameter_form=Dictionary(
+                    title=Title("Time budgets of sections"),
+                    help_text=Help("Time a section may take, within the deadline of the agent run. "
+                                   "A section exceeding its budget is handled like a section which can not be fetched."),
+                    elements={
+                        "aci_version": DictElement(parameter_form=_section_budget(Title("Software versions"))),
+                        "aci_health": DictElement(parameter_form=_section_budget(Title("Fabric health"))),
+                        "aci_tenants": DictElement(parameter_form=_section_budget(Title("Tenants"))),
+                        "aci_nodes": DictElement(parameter_form=_section_budget(Title("Node inventory"))),
+                        "aci_bgp_peer_entry": DictElement(parameter_form=_section_budget(Title("ACI BGP Peer entry"))),
+                        "aci_fault_inst": DictElement(parameter_form=_section_budget(Title("ACI Fault instance"))),
+                        "aci_l1_phys_if": DictElement(parameter_form=_section_budget(Title("ACI Layer 1 Physical Interfaces"))),
+                        "aci_dom_pwr_stats": DictElement(parameter_form=_section_budget(Title("ACI DOM Power Stats"))),
+                    },
+                ),
+            ),
             "skip_sections": DictElement(
                 parameter_form=MultipleChoice(
                     title=Title("Agent sections to be skipped"),
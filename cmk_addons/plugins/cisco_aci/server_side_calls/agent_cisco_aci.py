@@ -36,12 +36,31 @@ Validator class to validate all the params
 """
 
 
+class ACICertificate(BaseModel):
+    cert_name: str
+    private_key: str
+
+
 class ACIParams(BaseModel):
     host: str
     user: str
-    password: Secret
+    password: Secret | None = None
+    certificate: ACICertificate | None = None
     dns_domain: str | None = None
     only_iface_admin_up: bool | None = None
+    skip_cleared_faults: bool | None = None
+    only_nonzero_counters: bool | None = None
+    shard_by_node: bool | None = None
+    iface_details_mode: str | None = None
+    load_balance: str | None = None
+    max_concurrency: int | None = None
+    max_retries: int | None = None
+    page_size: int | None = None
+    stream_json: bool | None = None
+    section_cache_ttls: dict[str, float] | None = None
+    stale_max_age: float | None = None
+    deadline: float | None = None
+    section_budgets: dict[str, float] | None = None
     skip_sections: list | None = None
 
 
@@ -60,8 +79,15 @@ def generate_cisco_aci_command(params: ACIParams, host_config: HostConfig) -> It
     args: list[str | Secret] = []
     args.append("--user")
     args.append(params.user)
-    args.append("--password")
-    args.append(params.password.unsafe())
+
+    if params.certificate is not None:
+        args.append("--cert-name")
+        args.append(params.certificate.cert_name)
+        args.append("--private-key")
+        args.append(params.certificate.private_key)
+    elif params.password is not None:
+        args.append("--password")
+        args.append(params.password.unsafe())
 
     if params.dns_domain is not None:
         args.append("--dns-domain")
@@ -70,6 +96,54 @@ def generate_cisco_aci_command(params: ACIParams, host_config: HostConfig) -> It
     if params.only_iface_admin_up:
         args.append("--only-iface-admin-up")
 
+    if params.skip_cleared_faults:
+        args.append("--skip-cleared-faults")
+
+    if params.only_nonzero_counters:
+        args.append("--only-nonzero-counters")
+
+    if params.shard_by_node:
+        args.append("--shard-by-node")
+
+    if params.iface_details_mode is not None:
+        args.append("--iface-details-mode")
+        args.append(params.iface_details_mode.removeprefix("per_"))
+
+    if params.load_balance is not None:
+        args.append("--load-balance")
+        args.append(params.load_balance.replace("_", "-"))
+
+    if params.max_concurrency is not None:
+        args.append("--max-concurrency")
+        args.append(str(params.max_concurrency))
+
+    if params.max_retries is not None:
+        args.append("--max-retries")
+        args.append(str(params.max_retries))
+
+    if params.page_size is not None:
+        args.append("--page-size")
+        args.append(str(params.page_size))
+
+    if params.stream_json:
+        args.append("--stream-json")
+
+    for section, ttl in (params.section_cache_ttls or {}).items():
+        args.append("--cache-ttl")
+        args.append(f"{section}={int(ttl)}")
+
+    if params.stale_max_age is not None:
+        args.append("--stale-max-age")
+        args.append(str(int(params.stale_max_age)))
+
+    if params.deadline is not None:
+        args.append("--deadline")
+        args.append(str(params.deadline))
+
+    for section, budget in (params.section_budgets or {}).items():
+        args.append("--section-budget")
+        args.append(f"{section}={int(budget)}")
+
     if params.skip_sections:
         if "aci_bgp_peer_entry" in params.skip_sections:
             args.append("--skip-bgp-peer-entry")
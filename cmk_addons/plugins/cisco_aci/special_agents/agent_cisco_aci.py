@@ -20,20 +20,45 @@ Authors:    Samuel Zehnder <zehnder@netcloud.ch>
 
 """
 
+import argparse
+import base64
+import codecs
 import concurrent.futures
+import contextvars
+import cProfile
+import fcntl
+import functools
+import gzip
+import hashlib
+import io
 import itertools
 import json
 import logging
+import math
+import operator
+import os
+import pstats
+import queue
+import random
+import re
+import stat
+import sys
+import tempfile
 import threading
 import time
+import tracemalloc
 from collections import defaultdict
-from dataclasses import dataclass
+from contextlib import contextmanager, redirect_stdout
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 from enum import Enum, unique
-from os.path import join
-from typing import Dict, List, NamedTuple, Optional, Sequence, Set, Tuple
-from urllib.parse import urljoin
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Set, Tuple
+from urllib.parse import urlencode, urljoin, urlsplit
 
 import requests
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding
 from cmk.special_agents.v0_unstable.agent_common import ConditionalPiggybackSection, SectionWriter, special_agent_main
 from cmk.special_agents.v0_unstable.argument_parsing import Args, create_default_argument_parser
 
@@ -41,13 +66,39 @@ LOGGING = logging.getLogger("agent_cisco_aci")
 
 requests.packages.urllib3.disable_warnings()
 
-MAX_RETRIES: str = 3
-SLEEP_SECONDS: str = 3
+MAX_RETRIES: int = 3
+RETRY_BACKOFF: float = 0.5  # delay before the first retry, doubled for every further retry
+RETRY_MAX_DELAY: float = 10.0
+RETRY_MAX_TIME: float = 30.0  # time spent waiting for retries of one request
+RETRY_STATUS: Tuple = (requests.codes.too_many_requests, requests.codes.internal_server_error, requests.codes.bad_gateway, requests.codes.service_unavailable, requests.codes.gateway_timeout)
+IDEMPOTENT_METHODS: Tuple = ("GET", "HEAD", "OPTIONS")
+INITIAL_CONCURRENCY: int = 4  # requests in flight to the APIC at the start, adapted by the ConcurrencyLimiter
+MAX_CONCURRENCY: int = 50
+LATENCY_TOLERANCE: float = 2.0  # an average latency above this multiple of the lowest latency seen (for the same kind of request) is congestion
+LATENCY_SMOOTHING: float = 0.2  # weight of the latest latency in the moving average, single slow requests (like TLS handshakes) are no congestion
+LATENCY_SLACK: float = 0.05  # ... and only if it is this many seconds above the lowest latency, which filters jitter of fast requests
+CONGESTION_STATUS: Tuple = (requests.codes.too_many_requests, requests.codes.service_unavailable)
+STREAM_CHUNK_SIZE: int = 64 * 1024
+LOGIN_TIMEOUT: float = 2.0
+REQUEST_TIMEOUT: float = 60.0  # connect and read timeout of every other request, also without a deadline
+SESSION_REFRESH_MARGIN: int = 180  # refresh cached APIC sessions which expire within the next 3 minutes
+DEADLINE_GRACE: float = 1.0  # a fetcher still running this many seconds after its deadline is abandoned
+LOGIN_HEAD_START: float = 0.5  # the controller which won the last login race is tried alone for this many seconds
 
 VERSION: float = 2.0
 NAME: str = "cisco_aci"
 
 DEFAULT_SEPARATOR: str = "|"
+SECTION_HEADER = re.compile(r"^(<<<[^<>:]+)(?=[:>])", re.MULTILINE)  # section headers, but not piggyback headers (<<<<host>>>>)
+SECTIONS: Tuple = ("aci_version", "aci_health", "aci_tenants", "aci_nodes", "aci_bgp_peer_entry", "aci_fault_inst", "aci_l1_phys_if", "aci_dom_pwr_stats")
+CACHEABLE_SECTIONS: Tuple = ("aci_version", "aci_tenants", "aci_nodes")
+FABRIC_HEALTH_DN: str = "topology/health"
+INTERFACE_RN: str = "/sys/phys-["  # the objects of an interface are below topology/pod-<pod>/node-<node>/sys/phys-[<interface>]
+
+# attributes of the ACI classes which are used by the sections, everything else is dropped while fetching
+DOM_PWR_STATS_FIELDS: Tuple = ("dn", "alert", "status", "hiAlarm", "hiWarn", "loAlarm", "loWarn", "value")
+BGP_PEER_ENTRY_FIELDS: Tuple = ("addr", "connAttempts", "connDrop", "connEst", "localIp", "localPort", "operSt", "remotePort", "type")
+FAULT_INST_FIELDS: Tuple = ("severity", "code", "descr", "dn", "ack")
 
 
 ###############################################################################
@@ -55,51 +106,526 @@ DEFAULT_SEPARATOR: str = "|"
 ###############################################################################
 
 
-class Apic:
-    def __init__(self, args) -> None:
-        url, session = self._log_into_aci(args)
-        self.url = url
-        self.session = session
+class ApicToken(NamedTuple):
+    """APIC session token as returned by `aaaLogin` and `aaaRefresh`"""
+
+    token: str
+    created: float
+    refresh_timeout: int
+
+    @staticmethod
+    def from_response(data: Dict) -> "ApicToken":
+        attributes = data["imdata"][0]["aaaLogin"]["attributes"]
+        return ApicToken(token=attributes["token"], created=time.time(), refresh_timeout=int(attributes.get("refreshTimeoutSeconds", 600)))
+
+    @property
+    def remaining(self) -> float:
+        """seconds until the token expires"""
+        return self.created + self.refresh_timeout - time.time()
 
-    def _log_into_aci(self, args):
-        num_hosts = len(args.host)
 
-        for i, host in enumerate(args.host, start=1):
-            url = f"https://{host}/api/"
+class SessionCache:
+    """APIC session tokens of one fabric and user, persisted between agent runs
+
+    The tokens are stored per controller URL. The cache file is locked while a session is resumed or
+    a new login is done, so concurrent agent runs for the same fabric do not log in twice.
+    """
+
+    def __init__(self, state_dir: str, hosts: Sequence[str], user: str) -> None:
+        self.path: str = os.path.join(state_dir, f"session_{_state_key(f'{user}@{_fabric_id(hosts)}')}.json")
+
+    @contextmanager
+    def locked(self) -> Iterator[None]:
+        with open(f"{self.path}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
             try:
-                session = self._login(url, args.user, args.password)
-                break
-            except requests.exceptions.ConnectionError as e:
-                self._handle_error(current_host=i, num_hosts=num_hosts, desc="Could not reach APIC (!!)", error=e, exit_code=2)
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def load(self) -> Dict[str, ApicToken]:
+        try:
+            with open(self.path) as cache_file:
+                return {url: ApicToken(**token) for url, token in json.load(cache_file).items()}
+        except (OSError, ValueError, TypeError) as e:
+            LOGGING.debug(f"no cached APIC sessions loaded: {e}")
+            return {}
+
+    def store(self, tokens: Dict[str, ApicToken]) -> None:
+        # the tokens are credentials, so the file is only readable by the site user
+        tmp_path = f"{self.path}.tmp"
+        with os.fdopen(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w") as cache_file:
+            json.dump({url: token._asdict() for url, token in tokens.items()}, cache_file)
+        os.replace(tmp_path, self.path)
+
+
+class FastestController:
+    """the controller which won the last login race of a fabric, it is tried first in the next agent run"""
+
+    def __init__(self, state_dir: str, hosts: Sequence[str]) -> None:
+        self.path: str = os.path.join(state_dir, f"login_{_state_key(_fabric_id(hosts))}.json")
+
+    def load(self) -> Optional[str]:
+        if not _private_dir(os.path.dirname(self.path)):
+            return None
+        try:
+            with open(self.path) as state_file:
+                return json.load(state_file)["url"]
+        except (OSError, ValueError, LookupError) as e:
+            LOGGING.debug(f"no fastest controller loaded: {e}")
+            return None
+
+    def store(self, url: str, seconds: float) -> None:
+        if not _private_dir(os.path.dirname(self.path)):
+            return
+        try:
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as state_file:
+                json.dump({"url": url, "seconds": round(seconds, 3)}, state_file)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            LOGGING.info(f"could not store fastest controller: {e}")
+
+
+class SectionCache:
+    """fetch results of slowly changing sections, reused until their TTL expired
+
+    The results are stored as JSON, the models in them (see `CACHED_MODELS`) are tagged with their class.
+    """
+
+    def __init__(self, state_dir: str, hosts: Sequence[str]) -> None:
+        self._path_prefix: str = os.path.join(state_dir, f"section_{_state_key(_fabric_id(hosts))}")
+
+    def _path(self, name: str) -> str:
+        return f"{self._path_prefix}_{name}.json"
+
+    def load(self, name: str, ttl: int) -> Optional[Tuple[float, Any]]:
+        """the time of the fetch and the fetch result, if it is younger than `ttl` seconds"""
+        if not _private_dir(os.path.dirname(self._path_prefix)):
+            return None
+        try:
+            with open(self._path(name)) as cache_file:
+                timestamp, data = json.load(cache_file, object_hook=_from_cache_json)
+        except (OSError, ValueError, LookupError, TypeError) as e:
+            LOGGING.debug(f"no cached {name} section loaded: {e}")
+            return None
+
+        if not 0 <= time.time() - timestamp < ttl:
+            return None
+        return timestamp, data
+
+    def store(self, name: str, timestamp: float, data: Any) -> None:
+        if not _private_dir(os.path.dirname(self._path_prefix)):
+            return
+        try:
+            tmp_path = f"{self._path(name)}.{os.getpid()}.tmp"
+            with os.fdopen(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w") as cache_file:
+                json.dump([timestamp, _to_cache_json(data)], cache_file)
+            os.replace(tmp_path, self._path(name))
+        except (OSError, TypeError) as e:
+            LOGGING.info(f"could not cache {name} section: {e}")
+
+
+class ApicSignatureAuth(requests.auth.AuthBase):
+    """sign every request with the private key of a user certificate, no login and no APIC session needed
+
+    The APIC verifies the signature of `<method><path and query><body>` with the certificate which is
+    configured for the user (`uni/userext/user-<user>/usercert-<cert_name>`).
+    """
 
-            except requests.HTTPError as e:
-                self._handle_error(current_host=i, num_hosts=num_hosts, desc=f"Could not login to ACI, Error: {e}", exit_code=3)
+    def __init__(self, user: str, cert_name: str, private_key_file: str) -> None:
+        with open(private_key_file, "rb") as key_file:
+            self._private_key = serialization.load_pem_private_key(key_file.read(), password=None)
+        self._cert_dn: str = f"uni/userext/user-{user}/usercert-{cert_name}"
+
+    def __call__(self, request: requests.PreparedRequest) -> requests.PreparedRequest:
+        body = request.body or b""
+        payload = f"{request.method}{request.path_url}".encode() + (body.encode() if isinstance(body, str) else body)
+        signature = base64.b64encode(self._private_key.sign(payload, padding.PKCS1v15(), hashes.SHA256())).decode()
+
+        cookies = {
+            "APIC-Request-Signature": signature,
+            "APIC-Certificate-Algorithm": "v1.0",
+            "APIC-Certificate-Fingerprint": "fingerprint",
+            "APIC-Certificate-DN": self._cert_dn,
+        }
+        request.headers["Cookie"] = "; ".join(f"{name}={value}" for name, value in cookies.items())
+        return request
 
-            except Exception as e:
-                self._handle_error(current_host=i, num_hosts=num_hosts, desc="Error occurred!", exit_code=3, error=e)
 
-        return url, session
+@unique
+class LoadBalanceMode(Enum):
+    """how requests are distributed over the controllers given by `--host`
 
-    @staticmethod
-    def _login(url, user, pwd) -> requests.Session:
-        """APIC Login"""
+    FAILOVER: all requests go to the first controller which answers
+    ROUND_ROBIN: log into all reachable controllers and use them in turn
+    LEAST_OUTSTANDING: log into all reachable controllers and use the one with the fewest requests in flight
+    """
+
+    FAILOVER: str = "failover"
+    ROUND_ROBIN: str = "round-robin"
+    LEAST_OUTSTANDING: str = "least-outstanding"
+
+
+class ApicController:
+    """a controller of the APIC cluster with its (logged in) session
+
+    The session is shared by all threads, its connection pool keeps the connections to the controller
+    alive across all sections (see `new_session`).
+    """
+
+    def __init__(self, url: str, session: requests.Session, resumed: bool = False) -> None:
+        self.url: str = url
+        self.session: requests.Session = session
+        self.resumed: bool = resumed  # session was taken from the session cache
+        self.generation: int = 0  # incremented when the session is renewed
+        self.renew_lock = threading.Lock()  # held while the session is renewed, so only one thread logs in again
+        self.outstanding: int = 0
+        self.request_count: int = 0
+
+    def connection_stats(self) -> Tuple[int, int]:
+        """number of HTTP requests and of new connections (TLS handshakes) of the session, including the login"""
+        pools = self.session.get_adapter(self.url).poolmanager.pools
+        pools = [pools[key] for key in pools.keys()]
+        return sum(pool.num_requests for pool in pools), sum(pool.num_connections for pool in pools)
+
+
+class RetryPolicy:
+    """when and how long to wait before a request to the APIC is repeated
+
+    Only requests with an idempotent method are retried, after a connection error (also a connection reset
+    while the body is read), a timeout or a response with one of the `statuses`. The delay grows exponentially
+    with jitter, unless the APIC asks for a delay with `Retry-After`. No retry is done if its delay exceeds
+    `max_time` (for all retries of the request) or the deadline of the current section.
+    """
+
+    def __init__(
+        self,
+        retries: int = MAX_RETRIES,
+        statuses: Sequence[int] = RETRY_STATUS,
+        methods: Sequence[str] = IDEMPOTENT_METHODS,
+        backoff: float = RETRY_BACKOFF,
+        max_delay: float = RETRY_MAX_DELAY,
+        max_time: float = RETRY_MAX_TIME,
+    ) -> None:
+        self.retries: int = retries
+        self.statuses: Sequence[int] = statuses
+        self.methods: Sequence[str] = methods
+        self.backoff: float = backoff
+        self.max_delay: float = max_delay
+        self.max_time: float = max_time
+
+    def retryable(self, response: Optional[requests.Response] = None, error: Optional[Exception] = None) -> bool:
+        if isinstance(error, DeadlineExceeded):
+            return False
+        if error is not None:
+            return isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError, requests.exceptions.Timeout))
+        return response is not None and response.status_code in self.statuses
+
+    def delay(self, method: str, attempt: int, waited: float, response: Optional[requests.Response] = None) -> Optional[float]:
+        """seconds to wait before retry number `attempt` (starting at 0), None if the request must not be retried"""
+        if method.upper() not in self.methods or attempt >= self.retries:
+            return None
+
+        delay = _retry_after(response) if response is not None else None
+        if delay is None:
+            # "equal jitter": spread the retries of concurrent requests, but wait at least half of the backoff
+            backoff = min(self.backoff * 2**attempt, self.max_delay)
+            delay = backoff / 2 + random.uniform(0, backoff / 2)
+
+        deadline = DEADLINE.get()
+        if waited + delay > self.max_time or (deadline is not None and time.monotonic() + delay >= deadline):
+            return None
+        return delay
+
+
+class Apic:
+    def __init__(self, args) -> None:
+        self._args = args
+        self.tracer: Optional[RequestTracer] = RequestTracer() if args.trace_file else None
+        self.recorder: Optional[ResponseRecorder] = ResponseRecorder(args.record_dir) if args.record_dir else None
+        self._signature_auth: bool = bool(args.cert_name)
+        self._session_cache: Optional[SessionCache] = None
+        if args.session_cache and not self._signature_auth and _private_dir(args.state_dir):
+            self._session_cache = SessionCache(args.state_dir, args.host, args.user)
+        self._load_balance: LoadBalanceMode = LoadBalanceMode(args.load_balance)
+        # repeating aaaLogin only creates another session, so it is retried, even on 401 (like before)
+        self._login_retry = RetryPolicy(retries=args.max_retries, statuses=(requests.codes.unauthorized, *RETRY_STATUS), methods=("POST",))
+        self._lock = threading.Lock()
+        self._next_controller: int = 0
+
+        start = time.monotonic()
+        self.controllers: List[ApicController] = self._connect()
+        self.login_seconds: float = time.monotonic() - start
+        self.concurrency = ConcurrencyLimiter(maximum=args.max_concurrency)
+        self.retry = RetryPolicy(retries=args.max_retries)
+        self.page_size: int = args.page_size
+        self.stream_json: bool = args.stream_json
+
+    def _connect(self) -> List[ApicController]:
+        """log into the controller(s), sessions of the session cache are resumed if possible"""
+        urls: List[str] = [_apic_url(host) for host in self._args.host]
+
+        if self._signature_auth:
+            # no login needed, every controller can be used right away
+            auth = ApicSignatureAuth(self._args.user, self._args.cert_name, self._args.private_key)
+            controllers = [ApicController(url, new_session(self._args.max_concurrency, self.tracer, self.recorder)) for url in urls]
+            for controller in controllers:
+                controller.session.auth = auth
+            return controllers
+
+        if self._session_cache is None:
+            if self._load_balance == LoadBalanceMode.FAILOVER:
+                url, session, _ = self._race_login(urls)
+                return [ApicController(url, session)]
+            logged_in, error = self._log_into_all(urls)
+            if not logged_in:
+                self._handle_login_error(error, current_host=len(urls), num_hosts=len(urls))
+            return [ApicController(url, session) for url, session, _ in logged_in]
+
+        error: Optional[Exception] = None
+        with self._session_cache.locked():
+            tokens: Dict[str, ApicToken] = self._session_cache.load()
+            controllers: List[ApicController] = []
+
+            for url in urls:
+                resumed = self._resume_session(url, tokens[url]) if url in tokens else None
+                if resumed:
+                    session, tokens[url] = resumed
+                    controllers.append(ApicController(url, session, resumed=True))
+                    if self._load_balance == LoadBalanceMode.FAILOVER:
+                        break
+                else:
+                    tokens.pop(url, None)
+
+            if self._load_balance == LoadBalanceMode.FAILOVER and not controllers:
+                url, session, tokens[url] = self._race_login(urls)
+                controllers.append(ApicController(url, session))
+            elif self._load_balance != LoadBalanceMode.FAILOVER:
+                resumed_urls = {controller.url for controller in controllers}
+                missing_urls = [url for url in urls if url not in resumed_urls]
+                logged_in, error = self._log_into_all(missing_urls) if missing_urls else ([], None)
+                for url, session, tokens[url] in logged_in:
+                    controllers.append(ApicController(url, session))
+
+            self._session_cache.store(tokens)
+
+        if not controllers:
+            # the resumed sessions are enough, the agent only fails if no controller can be used at all
+            self._handle_login_error(error, current_host=len(urls), num_hosts=len(urls))
+        return controllers
+
+    def _log_into_all(self, urls: List[str]) -> Tuple[List[Tuple[str, requests.Session, ApicToken]], Optional[Exception]]:
+        """log into all given controllers concurrently, unreachable controllers are skipped
+
+        returns the logged in controllers (possibly none) and the error of the last failed login
+        """
+
+        def login(url: str) -> Tuple[str, requests.Session, ApicToken]:
+            return (url, *self._login(url, self._args.user, self._args.password))
+
+        logged_in: List[Tuple[str, requests.Session, ApicToken]] = []
+        error: Optional[Exception] = None
+        with ContextThreadPoolExecutor(max_workers=len(urls)) as executor:
+            futures = {url: executor.submit(login, url) for url in urls}
+            for url, future in futures.items():
+                try:
+                    logged_in.append(future.result())
+                except Exception as e:
+                    LOGGING.info(f"could not log into {url}: {e}")
+                    error = e
+
+        LOGGING.info(f"logged into {len(logged_in)} of {len(urls)} controller(s)")
+        return logged_in, error
+
+    def _resume_session(self, url: str, token: ApicToken) -> Optional[Tuple[requests.Session, ApicToken]]:
+        """reuse a cached token, refresh it with `aaaRefresh` if it expires soon"""
+        if token.remaining <= 0:
+            return None
+
+        session = new_session(self._args.max_concurrency, self.tracer, self.recorder)
+        session.cookies.set("APIC-cookie", token.token)
+
+        if token.remaining > SESSION_REFRESH_MARGIN:
+            LOGGING.info(f"reuse cached session of {url}, valid for {int(token.remaining)}s")
+            return session, token
+
+        try:
+            response = session.get(url + "aaaRefresh.json", verify=False, timeout=remaining_time(LOGIN_TIMEOUT))
+            response.raise_for_status()
+            token = ApicToken.from_response(response.json())
+        except (requests.RequestException, ValueError, LookupError) as e:
+            LOGGING.info(f"could not refresh cached session of {url}: {e}")
+            return None
+
+        LOGGING.info(f"refreshed cached session of {url}")
+        session.cookies.clear()
+        session.cookies.set("APIC-cookie", token.token)
+        return session, token
+
+    def _renew_session(self, controller: ApicController, generation: int) -> None:
+        """log in again after a resumed session was rejected, only once and only by one thread
+
+        Only the threads using this controller wait for the login, `self._lock` (taken for every request) is not held.
+        """
+        with controller.renew_lock:
+            if generation != controller.generation:
+                return  # already renewed by another thread
+
+            LOGGING.info(f"cached session of {controller.url} was rejected, login again")
+            with self._session_cache.locked():
+                tokens: Dict[str, ApicToken] = self._session_cache.load()
+                controller.session.cookies.clear()  # the cookie of the cached session would shadow the new one
+                _, tokens[controller.url] = self._login(controller.url, self._args.user, self._args.password, session=controller.session)
+                self._session_cache.store(tokens)
+
+            with self._lock:
+                controller.resumed = False
+                controller.generation += 1
+
+    def _fail_over(self, controller: ApicController, generation: int) -> bool:
+        """log into the other controllers, after the controller of a resumed session is not reachable anymore
+
+        Only done in failover mode, where the resumed controller is used without contacting it at the
+        start. Its token is dropped from the session cache, so the next run logs in as well. Returns
+        whether the request should be repeated.
+        """
+        others: List[str] = [url for url in map(_apic_url, self._args.host) if url != controller.url]
+        if self._load_balance != LoadBalanceMode.FAILOVER or not others:
+            return False
+
+        with controller.renew_lock:
+            if generation != controller.generation:
+                return True  # already done by another thread
+
+            LOGGING.info(f"{controller.url} of the cached session is not reachable, log into {', '.join(others)}")
+            logged_in: Optional[Tuple[str, requests.Session, ApicToken]] = None
+            with self._session_cache.locked():
+                tokens: Dict[str, ApicToken] = self._session_cache.load()
+                tokens.pop(controller.url, None)
+                try:
+                    logged_in = self._race_login(others, fatal=False)
+                    tokens[logged_in[0]] = logged_in[2]
+                except Exception as e:
+                    LOGGING.info(f"could not fail over: {e}")
+                self._session_cache.store(tokens)
+
+            with self._lock:
+                if logged_in is not None:
+                    controller.url, controller.session = logged_in[0], logged_in[1]
+                controller.resumed = False
+                controller.generation += 1
+
+        return logged_in is not None
+
+    def _race_login(self, urls: List[str], fatal: bool = True) -> Tuple[str, requests.Session, ApicToken]:
+        """log into all controllers at once and use the session of the first successful login
+
+        The winner of the last race is tried alone for `LOGIN_HEAD_START` seconds, so usually only one
+        login is done. The logins run in daemon threads, so the agent does not wait for the losers when
+        it is done. Their retries are cancelled when the race is decided, and sessions of logins which
+        succeed later on are logged out again. If no login succeeds, the agent exits, or the error of the
+        last login is raised if not `fatal`.
+        """
+        fastest = FastestController(self._args.state_dir, self._args.host)
+        preferred = fastest.load()
+        if preferred in urls:
+            urls = [preferred] + [url for url in urls if url != preferred]
+
+        start = time.time()
+        cancelled = threading.Event()
+
+        def login(url: str) -> concurrent.futures.Future:
+            return run_in_daemon_thread(f"login {url}", lambda: (url, *self._login(url, self._args.user, self._args.password, cancelled)))
+
+        pending: Dict[concurrent.futures.Future, str] = {login(urls[0]): urls[0]}
+        waiting: List[str] = urls[1:]
+        winner: Optional[Tuple[str, requests.Session, ApicToken]] = None
+        error: Optional[Exception] = None
+
+        try:
+            while winner is None and (pending or waiting):
+                done, _ = concurrent.futures.wait(pending, timeout=LOGIN_HEAD_START if waiting else None, return_when=concurrent.futures.FIRST_COMPLETED)
+
+                for future in done:
+                    url = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        LOGGING.info(f"could not log into {url}: {e}")
+                        error = e
+                        continue
+                    if winner is None:
+                        winner = result
+                    else:
+                        self._logout(*result[:2])
+
+                if winner is None and waiting and (not done or not pending):
+                    # the head start is over or the preferred controller failed, try all others now
+                    pending.update({login(url): url for url in waiting})
+                    waiting = []
+        finally:
+            cancelled.set()
+            for future, url in pending.items():
+                future.add_done_callback(functools.partial(self._discard_login, url))
+
+        if winner is None:
+            if not fatal:
+                raise error
+            self._handle_login_error(error, current_host=len(urls), num_hosts=len(urls))
+
+        seconds = time.time() - start
+        LOGGING.info(f"logged into {winner[0]} after {seconds:.2f}s")
+        if len(urls) > 1:
+            fastest.store(winner[0], seconds)
+
+        return winner
+
+    def _discard_login(self, url: str, future: concurrent.futures.Future) -> None:
+        """log out of a session whose login lost the race"""
+        if not future.cancelled() and future.exception() is None:
+            self._logout(url, future.result()[1])
+
+    def _logout(self, url: str, session: requests.Session) -> None:
+        try:
+            session.post(url + "aaaLogout.json", json={"aaaUser": {"attributes": {"name": self._args.user}}}, verify=False, timeout=remaining_time(LOGIN_TIMEOUT))
+        except requests.RequestException as e:
+            LOGGING.debug(f"could not log out of {url}: {e}")
+        finally:
+            session.close()
+
+    def _login(self, url, user, pwd, cancelled: Optional[threading.Event] = None, session: Optional[requests.Session] = None) -> Tuple[requests.Session, ApicToken]:
+        """APIC Login, with a new session or (to renew a session) with the given one"""
 
         creds = {"aaaUser": {"attributes": {"name": user, "pwd": pwd}}}
 
-        counter = 1
-        s = requests.Session()
-        response = s.post(url + "aaaLogin.json", json=creds, verify=False, timeout=2.0)
+        attempt, waited = 0, 0.0
+        s = session or new_session(self._args.max_concurrency, self.tracer, self.recorder)
+        response = s.post(url + "aaaLogin.json", json=creds, verify=False, timeout=remaining_time(LOGIN_TIMEOUT))
 
-        while response.status_code == requests.codes.unauthorized:
-            if counter > MAX_RETRIES:
-                raise requests.HTTPError(json.loads(response.text)["imdata"][0]["error"]["attributes"]["text"])
-            time.sleep(SLEEP_SECONDS)
-            response = s.post(url + "aaaLogin.json", data=json.dumps(creds), verify=False, timeout=2.0)
-            counter += 1
+        while self._login_retry.retryable(response):
+            delay = self._login_retry.delay("POST", attempt, waited, response)
+            if delay is None:
+                if response.status_code == requests.codes.unauthorized:
+                    raise requests.HTTPError(json.loads(response.text)["imdata"][0]["error"]["attributes"]["text"])
+                break
+            if (cancelled or threading.Event()).wait(delay):
+                raise requests.HTTPError("login cancelled")
+            response = s.post(url + "aaaLogin.json", data=json.dumps(creds), verify=False, timeout=remaining_time(LOGIN_TIMEOUT))
+            attempt, waited = attempt + 1, waited + delay
 
         response.raise_for_status()
 
-        return s
+        return s, ApicToken.from_response(response.json())
+
+    @classmethod
+    def _handle_login_error(cls, error: Exception, current_host: int, num_hosts: int):
+        if isinstance(error, requests.exceptions.ConnectionError):
+            cls._handle_error(current_host=current_host, num_hosts=num_hosts, desc="Could not reach APIC (!!)", error=error, exit_code=2)
+        elif isinstance(error, requests.HTTPError):
+            cls._handle_error(current_host=current_host, num_hosts=num_hosts, desc=f"Could not login to ACI, Error: {error}", exit_code=3, error=None)
+        else:
+            cls._handle_error(current_host=current_host, num_hosts=num_hosts, desc="Error occurred!", exit_code=3, error=error)
 
     @staticmethod
     def _handle_error(current_host: int, num_hosts: int, desc: str, exit_code: int, error: Optional[Exception]):
@@ -109,14 +635,372 @@ class Apic:
                 LOGGING.error(error)
             exit(exit_code)
 
+    def _acquire_controller(self) -> ApicController:
+        """pick the controller for the next request according to the load balance mode"""
+        with self._lock:
+            if not self.controllers:
+                raise requests.exceptions.ConnectionError("no reachable APIC left")
+
+            if self._load_balance == LoadBalanceMode.ROUND_ROBIN:
+                controller = self.controllers[self._next_controller % len(self.controllers)]
+                self._next_controller += 1
+            elif self._load_balance == LoadBalanceMode.LEAST_OUTSTANDING:
+                controller = min(self.controllers, key=lambda controller: controller.outstanding)
+            else:
+                controller = self.controllers[0]
+
+            controller.outstanding += 1
+            controller.request_count += 1
+            return controller
+
+    def _release_controller(self, controller: ApicController) -> None:
+        with self._lock:
+            controller.outstanding -= 1
+
+    def _remove_controller(self, controller: ApicController) -> None:
+        with self._lock:
+            if controller in self.controllers:
+                self.controllers.remove(controller)
+                LOGGING.info(f"{controller.url} is not reachable, {len(self.controllers)} controller(s) left")
+
+    def _get(self, endpoint: str, stream: bool = False) -> requests.Response:
+        kind = _request_kind(endpoint)
+        attempt, waited = 0, 0.0
+
+        while True:
+            error: Optional[Exception] = None
+            response: Optional[requests.Response] = None
+
+            epoch = self.concurrency.acquire()
+            streaming = False
+            try:
+                timeout = remaining_time(REQUEST_TIMEOUT)
+                controller = self._acquire_controller()
+                generation = controller.generation
+                start = time.monotonic()
+                count_requests(requests=1)
+                try:
+                    response = controller.session.get(urljoin(controller.url, endpoint), verify=False, stream=stream, timeout=timeout)
+
+                    if controller.resumed and response.status_code in (requests.codes.unauthorized, requests.codes.forbidden):
+                        # the cached session expired or was revoked on the APIC
+                        response.close()
+                        self._renew_session(controller, generation)
+                        timeout = remaining_time(REQUEST_TIMEOUT)
+                        start = time.monotonic()
+                        count_requests(requests=1)
+                        response = controller.session.get(urljoin(controller.url, endpoint), verify=False, stream=stream, timeout=timeout)
+                except requests.exceptions.ConnectionError as e:
+                    count_requests(errors=1)
+                    if len(self.controllers) > 1:
+                        # drop the controller and try the remaining ones right away
+                        self._remove_controller(controller)
+                        continue
+                    if controller.resumed and self._fail_over(controller, generation):
+                        continue
+                    error = e
+                except requests.exceptions.ChunkedEncodingError as e:
+                    # the connection was reset while the body was read
+                    count_requests(errors=1)
+                    error = e
+                except requests.exceptions.Timeout as e:
+                    if timeout >= REQUEST_TIMEOUT:
+                        # a timeout cut short by the budget of the section or the deadline of the run is no congestion
+                        self.concurrency.record(epoch, kind, time.monotonic() - start, congested=True)
+                    count_requests(errors=1)
+                    error = e
+                else:
+                    if stream and response.ok:
+                        # the body is still to be downloaded, see _release_on_close
+                        self._release_on_close(response, epoch, kind, start)
+                        streaming = True
+                    else:
+                        self.concurrency.record(epoch, kind, time.monotonic() - start, congested=response.status_code in CONGESTION_STATUS)
+                    if not response.ok:
+                        count_requests(errors=1)
+                finally:
+                    self._release_controller(controller)
+            finally:
+                if not streaming:
+                    self.concurrency.release()
+
+            delay = self.retry.delay("GET", attempt, waited, response) if self.retry.retryable(response, error) else None
+            if delay is None:
+                if error is not None:
+                    raise error
+                response.raise_for_status()
+                if not stream:
+                    # streamed responses are counted by ImdataStream while they are read
+                    count_requests(response_bytes=len(response.content))
+                return response
+
+            LOGGING.info(f"retry {endpoint} in {delay:.1f}s after {error or response.status_code}")
+            count_requests(retries=1)
+            if response is not None:
+                response.close()
+            time.sleep(delay)
+            attempt, waited = attempt + 1, waited + delay
+
+    def _release_on_close(self, response: requests.Response, epoch: int, kind: str, start: float) -> None:
+        """hold the concurrency slot of a streamed response until it is closed (see `ImdataStream`)
+
+        The APIC is still busy sending the body after the headers arrived, so its latency includes the transfer.
+        """
+        close = response.close
+        released = False
+
+        def close_and_release() -> None:
+            nonlocal released
+            close()
+            if not released:
+                released = True
+                self.concurrency.record(epoch, kind, time.monotonic() - start)
+                self.concurrency.release()
+
+        response.close = close_and_release
+
+    def log_request_distribution(self) -> None:
+        for controller in self.controllers:
+            requests_sent, handshakes = controller.connection_stats()
+            LOGGING.info(f"{controller.url}: {controller.request_count} request(s), {requests_sent} HTTP request(s) over {handshakes} connection(s)")
+
+    def close(self) -> None:
+        for controller in self.controllers:
+            controller.session.close()
+
+    def get_json(self, endpoint: str) -> Dict:
+        return self._get(endpoint).json()
+
     def get_imdata(self, endpoint: str) -> List:
-        response = self.session.get(urljoin(self.url, endpoint))
-        response.raise_for_status()
-        return response.json()["imdata"]
+        imdata = self.get_json(endpoint)["imdata"]
+        count_requests(objects=len(imdata))
+        return imdata
+
+    def _get_class_page(self, endpoint: str, aci_class: str, project: Callable[[Dict], Any]) -> Tuple[List, int]:
+        """return the projected attributes of all objects in the response and the `totalCount` of the query"""
+        if self.stream_json:
+            objects, total_count = self._get_streamed_page(endpoint, aci_class, project)
+        else:
+            data = self.get_json(endpoint)
+            objects = [project(item[aci_class]["attributes"]) for item in data["imdata"]]
+            total_count = int(data.get("totalCount", 0))
+
+        count_requests(objects=len(objects))
+        return objects, total_count
+
+    def _get_streamed_page(self, endpoint: str, aci_class: str, project: Callable[[Dict], Any]) -> Tuple[List, int]:
+        """`_get_class_page` with `ImdataStream`, the page is fetched again if reading its body fails"""
+        attempt, waited = 0, 0.0
+        while True:
+            stream = ImdataStream(self._get(endpoint, stream=True))
+            try:
+                return [project(item[aci_class]["attributes"]) for item in stream], stream.total_count
+            except (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError) as e:
+                count_requests(errors=1)
+                delay = self.retry.delay("GET", attempt, waited)
+                if delay is None:
+                    raise
+                LOGGING.info(f"retry {endpoint} in {delay:.1f}s after {e}")
+                count_requests(retries=1)
+                time.sleep(delay)
+                attempt, waited = attempt + 1, waited + delay
+
+    def get_data_from_class(
+        self,
+        aci_class: str,
+        fields: Optional[Sequence[str]] = None,
+        query_filter: Optional[str] = None,
+        parent_dn: Optional[str] = None,
+        record: Optional[Callable[[Dict], Any]] = None,
+    ) -> List:
+        """fetch the attributes of all objects of a class, reduced to `fields` if given
+
+        With a `record` (e.g. `L1PhysIf.from_attributes`), every object is converted into a compact record instead.
+        With a `query_filter` (see `filter_eq`), only the matching objects are selected and sent by the APIC.
+        With a `parent_dn` (e.g. `topology/pod-1/node-101`), only the objects below this DN are queried.
+        With paging enabled, the first page is fetched to learn `totalCount`, then the remaining pages are fetched concurrently.
+        """
+        endpoint = f"node/class/{parent_dn}/{aci_class}.json" if parent_dn else f"class/{aci_class}.json"
+        if query_filter:
+            endpoint = _add_query(endpoint, **{"query-target-filter": query_filter})
+        project: Callable[[Dict], Any] = record or functools.partial(_select_fields, fields=fields)
+
+        if not self.page_size:
+            return self._get_class_page(endpoint, aci_class, project)[0]
+
+        def get_page(page: int) -> Tuple[List, int]:
+            # a stable sort order is required, otherwise objects may move between pages
+            query = {"order-by": f"{aci_class}.dn", "page-size": self.page_size, "page": page}
+            return self._get_class_page(_add_query(endpoint, **query), aci_class, project)
+
+        result, total_count = get_page(0)
+        page_count: int = math.ceil(total_count / self.page_size)
+
+        if page_count > 1:
+            LOGGING.debug(f"fetch {page_count - 1} more page(s) of {aci_class}")
+            with ContextThreadPoolExecutor(max_workers=min(page_count - 1, self.concurrency.maximum)) as executor:
+                for page, _ in executor.map(get_page, range(1, page_count)):
+                    result.extend(page)
+
+        return result
+
+
+class ImdataStream:
+    """incrementally decode the `imdata` list of an APIC response while the body is downloaded
+
+    Only the current chunk and the not yet decoded rest of the body are kept in memory, the `imdata`
+    objects are yielded one by one. `total_count` is available once the stream is consumed.
+
+    APIC responses look like this: `{"totalCount":"2","imdata":[{"faultInst":{...}},{"faultInst":{...}}]}`
+    """
+
+    IMDATA_START = re.compile(r'"imdata"\s*:\s*\[')
+    TOTAL_COUNT = re.compile(r'"totalCount"\s*:\s*"?(\d+)')
+
+    def __init__(self, response: requests.Response, chunk_size: int = STREAM_CHUNK_SIZE) -> None:
+        self.total_count: int = 0
+        self._response = response
+        self._chunks: Iterator[bytes] = response.iter_content(chunk_size=chunk_size)
+        self._text_decoder = codecs.getincrementaldecoder(response.encoding or "utf-8")()
+        self._json_decoder = json.JSONDecoder()
+        self._buffer: str = ""
+        self._pos: int = 0
+
+    def _read(self) -> bool:
+        """append the next chunk to the buffer and drop the part which is already decoded"""
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            return False
+        count_requests(response_bytes=len(chunk))
+        self._buffer = self._buffer[self._pos :] + self._text_decoder.decode(chunk)
+        self._pos = 0
+        return True
+
+    def _parse_total_count(self, text: str) -> None:
+        match = self.TOTAL_COUNT.search(text)
+        if match:
+            self.total_count = int(match.group(1))
+
+    def __iter__(self) -> Iterator[Dict]:
+        try:
+            yield from self._iter_imdata()
+        finally:
+            self._response.close()
+
+    def _iter_imdata(self) -> Iterator[Dict]:
+        while not (match := self.IMDATA_START.search(self._buffer)):
+            if not self._read():
+                raise ValueError("no imdata found in APIC response")
+
+        self._parse_total_count(self._buffer[: match.start()])
+        self._pos = match.end()
+
+        while True:
+            # skip whitespace and separators between the objects
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in " \t\r\n,":
+                self._pos += 1
+
+            if self._pos >= len(self._buffer):
+                if not self._read():
+                    raise ValueError("APIC response ended within imdata")
+                continue
+
+            if self._buffer[self._pos] == "]":
+                break
+
+            try:
+                item, self._pos = self._json_decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                # the object is not downloaded completely yet
+                if not self._read():
+                    raise
+                continue
+
+            yield item
+
+        # totalCount may also follow the imdata list
+        rest = self._buffer[self._pos :]
+        while self._read():
+            rest = self._buffer
+        self._parse_total_count(rest)
+
 
-    def get_data_from_class(self, aci_class: str) -> List:
-        result = self.get_imdata(endpoint=f"class/{aci_class}.json")
-        return [item[aci_class]["attributes"] for item in result]
+class QueryNeed(NamedTuple):
+    """the objects a section needs: all objects of `classes` below the DN `scope`, with some of their children"""
+
+    classes: Tuple[str, ...]
+    scope: str = "topology"
+    children: Tuple[str, ...] = ()  # classes of the children returned with the objects (rsp-subtree-class)
+    include: Tuple[str, ...] = ()  # additional children, e.g. health (rsp-subtree-include)
+
+
+class QueryPlanner:
+    """combine the query needs of the sections into as few subtree queries as possible and route the objects back
+
+    The needs of all planned sections with the same scope are merged into one `node/mo/<scope>.json?query-target=subtree`
+    query with all their classes as `target-subtree-class`. The children options are merged as well, so objects
+    may come with children their section does not use. All sections are planned until `plan` is called with
+    the sections which are actually fetched (e.g. not taken from the section cache).
+
+    A query is sent when the first section needs its objects, the sections needing the same query wait for its
+    result (within their own deadline). The query runs in a thread of its own with the deadline of the run, so a
+    section running out of its budget does not fail the other sections waiting for the same query.
+    """
+
+    def __init__(self, apic: Apic, needs: Dict[str, QueryNeed]) -> None:
+        self.apic = apic
+        self.needs = needs
+        self.planned: Set[str] = set()
+        self.queries: Dict[str, str] = {}
+        self._deadline: Optional[float] = DEADLINE.get()
+        self._results: Dict[str, concurrent.futures.Future] = {}
+        self._lock = threading.Lock()
+        self.plan(needs)
+
+    def plan(self, sections: Iterable[str]) -> None:
+        """build the queries for the given sections only, the other sections can not `get` their objects"""
+        with self._lock:
+            self.planned = set(sections)
+            self.queries = {scope: self._build_query(scope) for scope in dict.fromkeys(need.scope for name, need in self.needs.items() if name in self.planned)}
+
+    def _build_query(self, scope: str) -> str:
+        needs: List[QueryNeed] = [need for name, need in self.needs.items() if need.scope == scope and name in self.planned]
+        classes, children, include = ({name: None for need in needs for name in getattr(need, field)} for field in ("classes", "children", "include"))
+
+        query: Dict[str, str] = {"query-target": "subtree", "target-subtree-class": ",".join(classes)}
+        if children:
+            query.update({"rsp-subtree": "children", "rsp-subtree-class": ",".join(children)})
+        if include:
+            query["rsp-subtree-include"] = ",".join(include)
+
+        return _add_query(f"node/mo/{scope}.json", **query)
+
+    def _query(self, scope: str) -> Dict[str, List[Dict]]:
+        with self._lock:
+            future = self._results.get(scope)
+            if future is None:
+                future = self._results[scope] = run_in_daemon_thread(f"query {scope}", self._fetch, self.queries[scope])
+
+        try:
+            return future.result(timeout=remaining_time())
+        except concurrent.futures.TimeoutError:
+            raise DeadlineExceeded(f"no result of the {scope} query within the deadline") from None
+
+    def _fetch(self, query: str) -> Dict[str, List[Dict]]:
+        DEADLINE.set(self._deadline)  # in the context of the query thread only
+        objects: Dict[str, List[Dict]] = defaultdict(list)
+        for item in self.apic.get_imdata(query):
+            aci_class = next(iter(item))
+            objects[aci_class].append(item)
+        return objects
+
+    def get(self, section: str) -> Dict[str, List[Dict]]:
+        """return the objects (as in `imdata`) of all classes the section needs"""
+        need: QueryNeed = self.needs[section]
+        if section not in self.planned:
+            raise ValueError(f"section {section} is not planned")
+        objects = self._query(need.scope)
+        return {aci_class: objects.get(aci_class, []) for aci_class in need.classes}
 
 
 @dataclass
@@ -129,6 +1013,7 @@ class AciNode:
     health: str = "-1"
     model: str = "unknown"
     descr: str = ""
+    dn: str = ""  # e.g. topology/pod-1/node-101
 
     def build_node_output(self) -> Tuple:
         if self.role == "controller":
@@ -225,27 +1110,56 @@ class AciTenant:
         )
 
 
-class PhysicalInterfaces(NamedTuple):
-    phys_iface: List
-    ether_stats_filtered: Dict
-    dot3_stats_filtered: Dict
-    phys_iface_details: Dict
+@dataclass(slots=True)
+class L1PhysIf:
+    """the written attributes of a `l1PhysIf` object, values repeated over many interfaces are interned"""
+
+    dn: str
+    id: str
+    admin_state: str
+    layer: str
+
+    @staticmethod
+    def from_attributes(attributes: Dict) -> "L1PhysIf":
+        return L1PhysIf(attributes["dn"], sys.intern(attributes["id"]), sys.intern(attributes["adminSt"]), sys.intern(attributes["layer"]))
+
+
+@dataclass(slots=True)
+class ErrorCounter:
+    """an error counter of an interface, `cRCAlignErrors` of `rmonEtherStats` or `fCSErrors` of `rmonDot3Stats`"""
+
+    dn: str
+    errors: Optional[str]
 
     @staticmethod
-    def _build_dn(dn: str, aci_class: str) -> str:
-        return join(dn, aci_class)
+    def crc_errors(attributes: Dict) -> "ErrorCounter":
+        return ErrorCounter(attributes["dn"], _intern(attributes.get("cRCAlignErrors")))
+
+    @staticmethod
+    def fcs_errors(attributes: Dict) -> "ErrorCounter":
+        return ErrorCounter(attributes["dn"], _intern(attributes.get("fCSErrors")))
+
+
+@dataclass(slots=True)
+class PhysIfDetails:
+    """the written attributes of an `ethpmPhysIf` object"""
 
-    def get_ether_stats(self, dn: str) -> Dict:
-        dn = self._build_dn(dn, "dbgEtherStats")
-        return self.ether_stats_filtered.get(dn, {})
+    dn: str
+    op_state: Optional[str]
+    op_speed: Optional[str]
+
+    @staticmethod
+    def from_attributes(attributes: Dict) -> "PhysIfDetails":
+        return PhysIfDetails(attributes["dn"], _intern(attributes.get("operSt")), _intern(attributes.get("operSpeed")))
 
-    def get_dot3_stats(self, dn: str) -> Dict:
-        dn = self._build_dn(dn, "dbgDot3Stats")
-        return self.dot3_stats_filtered.get(dn, {})
 
-    def get_phys_iface(self, dn: str) -> Dict:
-        dn = self._build_dn(dn, "phys")
-        return self.phys_iface_details.get(dn, {})
+class PhysicalInterfaces(NamedTuple):
+    phys_iface: List[L1PhysIf]
+    ether_stats: List[ErrorCounter]
+    dot3_stats: List[ErrorCounter]
+    phys_iface_details: List[PhysIfDetails]
+    # value of the error counters without a stats object, "0" if only non-zero counters were collected
+    missing_counter: Optional[str] = None
 
 
 class InterfaceDetails(NamedTuple):
@@ -258,17 +1172,22 @@ class InterfaceDetails(NamedTuple):
     op_state: str
     op_speed: str
 
-    def get_interface_details(interface: Dict, data: PhysicalInterfaces) -> "InterfaceDetails":
-        iface_dn: str = interface["dn"]
+    def get_interface_details(
+        interface: L1PhysIf,
+        ether_stats: Optional[ErrorCounter],
+        dot3_stats: Optional[ErrorCounter],
+        details: Optional[PhysIfDetails],
+        missing_counter: Optional[str] = None,
+    ) -> "InterfaceDetails":
         return InterfaceDetails(
-            dn=iface_dn,
-            id=interface["id"],
-            admin_state=interface["adminSt"],
-            layer=interface["layer"],
-            crc_errors=data.get_ether_stats(iface_dn).get("cRCAlignErrors"),
-            fcs_errors=data.get_dot3_stats(iface_dn).get("fCSErrors"),
-            op_state=data.get_phys_iface(iface_dn).get("operSt"),
-            op_speed=data.get_phys_iface(iface_dn).get("operSpeed"),
+            dn=interface.dn,
+            id=interface.id,
+            admin_state=interface.admin_state,
+            layer=interface.layer,
+            crc_errors=_errors(ether_stats, missing_counter),
+            fcs_errors=_errors(dot3_stats, missing_counter),
+            op_state=details.op_state if details else None,
+            op_speed=details.op_speed if details else None,
         )
 
     @staticmethod
@@ -308,6 +1227,20 @@ class InterfaceDetails(NamedTuple):
         return self.dn.split("/")[2]
 
 
+@unique
+class IfaceDetailsMode(Enum):
+    """how `ethpmPhysIf` (operational state and speed) is collected for the `l1PhysIf` objects
+
+    INTERFACE: one `node/mo/<dn>/phys.json` request per interface (legacy behaviour)
+    CLASS: a single fabric wide `ethpmPhysIf` class query
+    NODE: one `ethpmPhysIf` class query per switch node
+    """
+
+    INTERFACE: str = "interface"
+    CLASS: str = "class"
+    NODE: str = "node"
+
+
 @unique
 class PwrStatType(Enum):
     RX: str = "rx"
@@ -358,14 +1291,11 @@ class DomPwrStats(NamedTuple):
     tx: DomPwrStatsValues
 
     @staticmethod
-    def get_pwr_stats(rx_data: Dict, tx_stats: Dict) -> "DomPwrStats":
-        """builds a DomPwrStats object with a given element form"""
+    def get_pwr_stats(rx_data: Dict, tx_data: Dict) -> "DomPwrStats":
+        """builds a DomPwrStats object from the rx and tx stats of an interface"""
         rx_dn: str = rx_data.get("dn", "n/a")
-        tx_dn: str = rx_dn.replace("rxpower", "txpower")
         iface_dn: str = rx_dn.replace("/domstats/rxpower", "")
 
-        tx_data: Dict = tx_stats.get(tx_dn, {})
-
         return DomPwrStats(
             dn=iface_dn,
             rx=DomPwrStatsValues.get_pwr_stats(rx_data, stats_type=PwrStatType.RX),
@@ -404,24 +1334,305 @@ class DomPwrStats(NamedTuple):
         return self.dn.split("/")[2]
 
 
+@dataclass
+class RequestStats:
+    """the requests a section sent to the APIC in this run, reported in the aci_agent_perf section
+
+    A query shared by several sections (see `QueryPlanner`) is counted for the section which sent it.
+    """
+
+    section: str = ""
+    requests: int = 0
+    response_bytes: int = 0
+    objects: int = 0
+    retries: int = 0
+    errors: int = 0  # failed attempts, including the ones which succeeded on retry
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def add(self, **counts: int) -> None:
+        with self._lock:
+            for name, count in counts.items():
+                setattr(self, name, getattr(self, name) + count)
+
+
+class SectionStatus(NamedTuple):
+    """how a section was produced in this run, reported in the aci_agent_perf section"""
+
+    name: str
+    state: str  # ok, cached, stale or skipped
+    seconds: float = 0.0
+    detail: str = ""
+    stats: Optional[RequestStats] = None
+
+
+# models in the fetch results of the sections, which are stored in the section cache
+CACHED_MODELS: Tuple = (AciNode, AciTenant, InterfaceDetails, DomPwrStats, DomPwrStatsValues)
+
+
 ###############################################################################
 # Threading helpers                                                           #
 ###############################################################################
 
-thread_local = threading.local()
+# time.monotonic() by which the current section (or the login) has to be done, enforced on every HTTP request
+DEADLINE: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("deadline", default=None)
 
+# the RequestStats of the section the current fetcher belongs to, updated on every HTTP request
+REQUEST_STATS: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar("request_stats", default=None)
 
-def get_session(apic: Apic) -> requests.Session:
-    if not hasattr(thread_local, "session"):
-        thread_local.session = requests.Session()
-        thread_local.session.cookies = apic.session.cookies.copy()
-    return thread_local.session
+# wraps the calls run by a ContextThreadPoolExecutor, so the profile of a section covers its worker threads (see `SectionProfiler`)
+THREAD_PROFILER: contextvars.ContextVar[Optional[Callable[[Callable], Callable]]] = contextvars.ContextVar("thread_profiler", default=None)
 
+# held by every thread while writing to stdout (the scheduler and the PiggybackWriter), so sections are never interleaved
+OUTPUT_LOCK = threading.Lock()
 
-def get_interface_details(dn: str, apic: Apic):
-    with get_session(apic).get(urljoin(apic.url, f"node/mo/{dn}/phys.json"), verify=False) as response:
-        response.raise_for_status()
-        return response.json()["imdata"][0]["ethpmPhysIf"]["attributes"]
+
+class DeadlineExceeded(requests.exceptions.Timeout):
+    """the run deadline or the budget of the section is used up"""
+
+
+def count_requests(**counts: int) -> None:
+    """add to the request stats of the current section (if any), see `RequestStats`"""
+    stats = REQUEST_STATS.get()
+    if stats is not None:
+        stats.add(**counts)
+
+
+def remaining_time(limit: Optional[float] = None) -> Optional[float]:
+    """timeout for the next HTTP request: the time left until the deadline of the current context, at most `limit`"""
+    deadline = DEADLINE.get()
+    if deadline is None:
+        return limit
+
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise DeadlineExceeded("deadline exceeded")
+    return remaining if limit is None else min(remaining, limit)
+
+
+def run_in_daemon_thread(name: str, fn, /, *args) -> concurrent.futures.Future:
+    """run the call in a new daemon thread in a copy of the current context
+
+    Unlike the workers of a ThreadPoolExecutor, the thread does not keep the agent from exiting while
+    the call still runs, which is used for calls whose result may not be needed any more.
+    """
+    future: concurrent.futures.Future = concurrent.futures.Future()
+    context = contextvars.copy_context()
+
+    def run() -> None:
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(context.run(fn, *args))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name=name, daemon=True).start()
+    return future
+
+
+class ContextThreadPoolExecutor(concurrent.futures.ThreadPoolExecutor):
+    """run every call in a copy of the context of the submitting thread, so its deadline (and profiler) applies to the worker threads too"""
+
+    def submit(self, fn, /, *args, **kwargs) -> concurrent.futures.Future:
+        profiled = THREAD_PROFILER.get()
+        if profiled is not None:
+            fn = profiled(fn)
+        return super().submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+class RequestTracer:
+    """record every HTTP request to the APIC as a span, written in the Chrome trace event format
+
+    The trace file can be opened with chrome://tracing or https://ui.perfetto.dev, every thread is shown
+    as a track with its requests, which shows the requests on the critical path of the run.
+    """
+
+    def __init__(self) -> None:
+        self._origin: float = time.monotonic()
+        self._events: List[Dict] = []
+        self._threads: Dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def span(self, request: requests.PreparedRequest, start: float, status: str, response_bytes: Optional[int]) -> None:
+        end = time.monotonic()
+        thread = threading.current_thread()
+        stats = REQUEST_STATS.get()
+        event = {
+            "name": f"{request.method} {urlsplit(request.url).path.removeprefix('/api/')}",
+            "cat": "apic",
+            "ph": "X",
+            "ts": round((start - self._origin) * 1e6),
+            "dur": round((end - start) * 1e6),
+            "pid": os.getpid(),
+            "tid": thread.ident,
+            "args": {"url": request.url, "status": status, "bytes": response_bytes, "section": stats.section if stats else None},
+        }
+        with self._lock:
+            self._events.append(event)
+            self._threads.setdefault(thread.ident, thread.name)
+
+    def write(self, path: str) -> None:
+        threads = [{"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": ident, "args": {"name": name}} for ident, name in self._threads.items()]
+        with open(path, "w") as f:
+            json.dump({"traceEvents": threads + self._events, "displayTimeUnit": "ms"}, f)
+        LOGGING.info(f"wrote {len(self._events)} request(s) to trace file {path}")
+
+
+class ResponseRecorder:
+    """write every response of the APIC with its URL to a directory, to reproduce the responses of a fabric offline
+
+    The bodies are written gzip compressed as `<n>.json.gz`, the index `requests.jsonl` has a line with
+    the method, URL, status and file of every request. Neither request bodies, headers nor cookies are
+    written, and the values of `SECRET_ATTRIBUTES` (e.g. the session token returned by `aaaLogin`) are
+    replaced in the bodies.
+    """
+
+    SECRET_ATTRIBUTES = re.compile(rb'"(token|sessionId|pwd|password)"(\s*:\s*)"[^"]*"')
+    INDEX: str = "requests.jsonl"
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        self._count = itertools.count(1)
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def record(self, request: requests.PreparedRequest, response: requests.Response, body: bytes) -> None:
+        number: int = next(self._count)
+        name = f"{number:05d}.json.gz"
+        with gzip.open(os.path.join(self.directory, name), "wb") as f:
+            f.write(self.SECRET_ATTRIBUTES.sub(rb'"\1"\2"<scrubbed>"', body))
+
+        entry = {"n": number, "method": request.method, "url": request.url, "status": response.status_code, "bytes": len(body), "file": name}
+        with self._lock, open(os.path.join(self.directory, self.INDEX), "a") as f:
+            f.write(json.dumps(entry) + "\n")
+
+
+class InstrumentedAdapter(requests.adapters.HTTPAdapter):
+    """HTTP adapter which records every request with the `RequestTracer` and/or the `ResponseRecorder`
+
+    A request is traced once its body is read. A streamed response is traced when it is closed, with the
+    bytes downloaded until then. The recorder needs the whole body, so with a recorder streamed responses
+    are read at once as well (and decoded from memory).
+    """
+
+    def __init__(self, tracer: Optional[RequestTracer], recorder: Optional[ResponseRecorder], **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.tracer = tracer
+        self.recorder = recorder
+
+    def send(self, request: requests.PreparedRequest, stream: bool = False, **kwargs) -> requests.Response:
+        start = time.monotonic()
+        try:
+            response = super().send(request, stream=stream, **kwargs)
+            # read the body as the session would do right after, so the span includes the download
+            body: Optional[bytes] = response.content if not stream or self.recorder else None
+        except Exception as e:
+            if self.tracer is not None:
+                self.tracer.span(request, start, type(e).__name__, None)
+            raise
+
+        if body is not None:
+            if self.tracer is not None:
+                self.tracer.span(request, start, str(response.status_code), len(body))
+            if self.recorder is not None:
+                self.recorder.record(request, response, body)
+            return response
+
+        close = response.close
+
+        def close_traced() -> None:
+            response_bytes = response.raw.tell() if response.raw is not None else None
+            close()
+            self.tracer.span(request, start, str(response.status_code), response_bytes)
+            response.close = close
+
+        response.close = close_traced
+        return response
+
+
+def new_session(pool_size: int, tracer: Optional[RequestTracer] = None, recorder: Optional[ResponseRecorder] = None) -> requests.Session:
+    """session for one controller, shared by all threads
+
+    The connection pool keeps up to `pool_size` connections alive (the maximum number of requests in
+    flight), so a TLS handshake is only needed when the concurrency grows, not in every thread or section.
+    With a `tracer` and/or a `recorder`, every request of the session is traced or recorded.
+    """
+    session = requests.Session()
+    adapter_args: Dict[str, int] = {"pool_connections": 1, "pool_maxsize": max(pool_size, 1)}
+    if tracer or recorder:
+        session.mount("https://", InstrumentedAdapter(tracer, recorder, **adapter_args))
+    else:
+        session.mount("https://", requests.adapters.HTTPAdapter(**adapter_args))
+    return session
+
+
+def get_interface_details(dn: str, apic: Apic) -> PhysIfDetails:
+    return PhysIfDetails.from_attributes(apic.get_imdata(f"node/mo/{dn}/phys.json")[0]["ethpmPhysIf"]["attributes"])
+
+
+def get_node_interface_details(node_dn: str, apic: Apic) -> List[PhysIfDetails]:
+    return apic.get_data_from_class("ethpmPhysIf", parent_dn=node_dn, record=PhysIfDetails.from_attributes)
+
+
+class ConcurrencyLimiter:
+    """AIMD limit of the requests in flight to the APIC, shared by all concurrent fetches of the agent
+
+    Until the first congestion, the limit grows by one with every request (slow start, doubles per window).
+    Then it grows by one after a window of `limit` requests without congestion (additive increase). It is
+    halved on congestion (multiplicative decrease): a 429/503 response, a timeout, or a moving average of
+    the latency above `LATENCY_TOLERANCE` times the lowest latency seen for the same kind of request. Congestion reported by
+    requests which were started before the last decrease does not decrease the limit again.
+    """
+
+    def __init__(self, initial: int = INITIAL_CONCURRENCY, maximum: int = MAX_CONCURRENCY) -> None:
+        self.maximum: int = max(maximum, 1)
+        self.limit: int = min(initial, self.maximum)
+        self.peak: int = self.limit
+        self.decreases: int = 0
+        self._in_flight: int = 0
+        self._successes: int = 0
+        self._epoch: int = 0  # incremented on every decrease
+        self._min_latency: Dict[str, float] = {}
+        self._avg_latency: Dict[str, float] = {}
+        self._condition = threading.Condition()
+
+    def acquire(self) -> int:
+        """wait for a free slot (at most until the deadline), returns the epoch for `record`"""
+        with self._condition:
+            while self._in_flight >= self.limit:
+                if not self._condition.wait(timeout=remaining_time()):
+                    remaining_time()  # raises once the deadline is over
+            self._in_flight += 1
+            return self._epoch
+
+    def release(self) -> None:
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify()
+
+    def record(self, epoch: int, kind: str, latency: float, congested: bool = False) -> None:
+        with self._condition:
+            min_latency = self._min_latency[kind] = min(self._min_latency.get(kind, latency), latency)
+            avg_latency = self._avg_latency[kind] = LATENCY_SMOOTHING * latency + (1 - LATENCY_SMOOTHING) * self._avg_latency.get(kind, latency)
+            congested = congested or avg_latency > max(min_latency * LATENCY_TOLERANCE, min_latency + LATENCY_SLACK)
+
+            if congested:
+                if epoch == self._epoch:
+                    self.limit = max(self.limit // 2, 1)
+                    self.decreases += 1
+                    self._epoch += 1
+                    self._successes = 0
+                    self._avg_latency.clear()  # the averages include the requests before the decrease
+                    LOGGING.debug(f"congestion ({kind} took {avg_latency:.2f}s on average), limit requests in flight to {self.limit}")
+                return
+
+            self._successes += 1
+            window = 1 if self.decreases == 0 else self.limit
+            if self._successes >= window and self.limit < self.maximum:
+                self.limit += 1
+                self.peak = max(self.peak, self.limit)
+                self._successes = 0
+                self._condition.notify()
 
 
 ###############################################################################
@@ -429,17 +1640,18 @@ def get_interface_details(dn: str, apic: Apic):
 ###############################################################################
 
 
-def get_aci_health(apic: Apic):
+def get_aci_health(planner: QueryPlanner):
     """Get Fabric Health Score"""
 
-    imdata = apic.get_imdata("node/mo/topology/health.json")
-    health_score = imdata[0]["fabricHealthTotal"]["attributes"]["cur"]
+    # there is a fabricHealthTotal object per pod as well
+    imdata = planner.get("aci_health")["fabricHealthTotal"]
+    health_score = next(item["fabricHealthTotal"]["attributes"]["cur"] for item in imdata if item["fabricHealthTotal"]["attributes"]["dn"] == FABRIC_HEALTH_DN)
 
     return int(health_score)
 
 
-def get_tenants(apic: Apic) -> List[AciTenant]:
-    imdata = apic.get_imdata("node/class/fvTenant.json?rsp-subtree-include=health")
+def get_tenants(planner: QueryPlanner) -> List[AciTenant]:
+    imdata = planner.get("aci_tenants")["fvTenant"]
     tenants = []
 
     for fv_tenant in imdata:
@@ -459,10 +1671,8 @@ def get_tenants(apic: Apic) -> List[AciTenant]:
     return tenants
 
 
-def get_nodes(apic: Apic) -> Dict:
-    response = apic.session.get(apic.url + "node/class/topSystem.json?query-target=self&rsp-subtree=children&rsp-subtree-class=eqptCh&rsp-subtree-include=health")
-    response.raise_for_status()
-    nodes = response.json()["imdata"]
+def get_nodes(planner: QueryPlanner) -> Dict:
+    nodes = planner.get("aci_nodes")["topSystem"]
     nodelist = dict(spine=[], leaf=[], controller=[])
 
     for node in nodes:
@@ -472,6 +1682,7 @@ def get_nodes(apic: Apic) -> Dict:
             state=node["topSystem"]["attributes"]["state"],
             serial=node["topSystem"]["attributes"]["serial"],
             node_id=node["topSystem"]["attributes"]["id"],
+            dn=_node_dn(node["topSystem"]["attributes"]["dn"]),
         )
 
         for child in node["topSystem"]["children"]:
@@ -486,28 +1697,26 @@ def get_nodes(apic: Apic) -> Dict:
     return nodelist
 
 
-def get_faults(session, url):
-    response = session.get(url + "node/mo/fltCnts.json")
-    response.raise_for_status()
-    faults = response.json()["imdata"][0]["faultCountsWithDetails"]["attributes"]
+def get_faults(apic: Apic):
+    faults = apic.get_imdata("node/mo/fltCnts.json")[0]["faultCountsWithDetails"]["attributes"]
     return faults["crit"], faults["warn"], faults["maj"], faults["minor"]
 
 
-def get_versions(session, url):
-    response = session.get(url + "node/class/firmwareCtrlrRunning.json")
-    response.raise_for_status()
-    versions = response.json()["imdata"]
+def get_health_status(planner: QueryPlanner) -> Tuple:
+    """Get Fabric Health Score and fault counters"""
+    return (get_aci_health(planner), *get_faults(planner.apic))
+
+
+def get_versions(planner: QueryPlanner):
+    firmware = planner.get("aci_version")
 
     running = []
-    for version in versions:
+    for version in firmware["firmwareCtrlrRunning"]:
         ctrl_id = version["firmwareCtrlrRunning"]["attributes"]["dn"].split("/")[2]
         version = version["firmwareCtrlrRunning"]["attributes"]["version"]
         running.append((ctrl_id, version))
 
-    response = session.get(url + "node/class/firmwareRunning.json")
-    response.raise_for_status()
-    versions = response.json()["imdata"]
-    for version in versions:
+    for version in firmware["firmwareRunning"]:
         node_id = version["firmwareRunning"]["attributes"]["dn"].split("/")[2]
         version = version["firmwareRunning"]["attributes"]["version"]
         running.append((node_id, version))
@@ -515,53 +1724,89 @@ def get_versions(session, url):
     return running
 
 
-def get_phys_iface(apic: Apic, only_iface_admin_up: bool, aci_nodes: Dict[str, str]):
-    raw_data: PhysicalInterfaces = __collect_data(apic, only_iface_admin_up)
+def get_phys_iface(
+    apic: Apic,
+    only_iface_admin_up: bool,
+    aci_nodes: Dict[str, str],
+    details_mode: IfaceDetailsMode = IfaceDetailsMode.CLASS,
+    only_nonzero_counters: bool = False,
+    node_dn: Optional[str] = None,
+):
+    raw_data: PhysicalInterfaces = __collect_data(apic, only_iface_admin_up, details_mode, only_nonzero_counters, node_dn)
     preprocessed_data: List[InterfaceDetails] = __merge_data(raw_data)
     grouped_data: Dict[str, InterfaceDetails] = __group_interface_by_host(preprocessed_data, aci_nodes)
 
     return grouped_data
 
 
-def __collect_data(apic: Apic, only_iface_admin_up: bool) -> PhysicalInterfaces:
-    phys_iface: List = apic.get_data_from_class(aci_class="l1PhysIf")
+def __collect_data(apic: Apic, only_iface_admin_up: bool, details_mode: IfaceDetailsMode, only_nonzero_counters: bool = False, node_dn: Optional[str] = None) -> PhysicalInterfaces:
+    """collect the interfaces of the whole fabric, or only of the node `node_dn`"""
+    # the APIC selects the interfaces with admin state up, instead of sending all of them
+    query_filter: Optional[str] = filter_eq("l1PhysIf", "adminSt", "up") if only_iface_admin_up else None
+    phys_iface: List[L1PhysIf] = apic.get_data_from_class(aci_class="l1PhysIf", query_filter=query_filter, parent_dn=node_dn, record=L1PhysIf.from_attributes)
+
+    # on a healthy fabric almost all error counters are zero, so the APIC may leave them out: a missing counter is then written as 0
+    ether_filter: Optional[str] = filter_ne("rmonEtherStats", "cRCAlignErrors", "0") if only_nonzero_counters else None
+    dot3_filter: Optional[str] = filter_ne("rmonDot3Stats", "fCSErrors", "0") if only_nonzero_counters else None
+    ether_stats: List[ErrorCounter] = apic.get_data_from_class(aci_class="rmonEtherStats", query_filter=ether_filter, parent_dn=node_dn, record=ErrorCounter.crc_errors)
+    dot3_stats: List[ErrorCounter] = apic.get_data_from_class(aci_class="rmonDot3Stats", query_filter=dot3_filter, parent_dn=node_dn, record=ErrorCounter.fcs_errors)
+
+    phys_iface_dn: Set = {iface.dn for iface in phys_iface}
 
-    if only_iface_admin_up:
-        phys_iface = [iface for iface in phys_iface if (iface["adminSt"] == "up")]
+    if details_mode == IfaceDetailsMode.INTERFACE:
+        phys_iface_details = __collect_phys_iface_details(apic, phys_iface_dn)
+    else:
+        phys_iface_details = __collect_phys_iface_details_bulk(apic, phys_iface_dn, details_mode, node_dn)
 
-    ether_stats: List = apic.get_data_from_class(aci_class="rmonEtherStats")
-    dot3_stats: List = apic.get_data_from_class(aci_class="rmonDot3Stats")
+    return PhysicalInterfaces(phys_iface, ether_stats, dot3_stats, phys_iface_details, missing_counter="0" if only_nonzero_counters else None)
 
-    phys_iface_dn: Set = {iface["dn"] for iface in phys_iface}
-    ether_stats_filtered: Dict = filter_stats(ether_stats, "dbgEtherStats", phys_iface_dn)
-    dot3_stats_filtered: Dict = filter_stats(dot3_stats, "dbgDot3Stats", phys_iface_dn)
 
-    phys_iface_details = __collect_phys_iface_details(apic, phys_iface_dn)
+def __collect_phys_iface_details_bulk(apic: Apic, phys_iface_dn: Set, details_mode: IfaceDetailsMode, node_dn: Optional[str] = None) -> List[PhysIfDetails]:
+    """collect phys interface details using `ethpmPhysIf` class queries (fabric wide or per node)
+
+    if the interfaces are collected for a single node `node_dn`, one class query of this node is used in both modes
+
+    the `ethpmPhysIf` objects are children of the `l1PhysIf` objects and are joined back by their interface (see `interface_dn`):
+    `topology/pod-1/node-101/sys/phys-[eth1/33]/phys` -> `topology/pod-1/node-101/sys/phys-[eth1/33]`
+    """
+    if node_dn:
+        request_count: int = 1
+        phys_iface_details = apic.get_data_from_class(aci_class="ethpmPhysIf", parent_dn=node_dn, record=PhysIfDetails.from_attributes)
+    elif details_mode == IfaceDetailsMode.NODE:
+        node_dns: Set = {_node_dn(dn) for dn in phys_iface_dn}
+        request_count: int = len(node_dns)
+
+        if node_dns:
+            with ContextThreadPoolExecutor(max_workers=min(len(node_dns), apic.concurrency.maximum)) as executor:
+                phys_iface_details = list(itertools.chain(*executor.map(get_node_interface_details, node_dns, itertools.repeat(apic))))
+        else:
+            phys_iface_details = []
+    else:
+        request_count = 1
+        phys_iface_details = apic.get_data_from_class(aci_class="ethpmPhysIf", record=PhysIfDetails.from_attributes)
 
-    return PhysicalInterfaces(phys_iface, ether_stats_filtered, dot3_stats_filtered, phys_iface_details)
+    LOGGING.info(f"collected details of {len(phys_iface_dn)} interfaces with {request_count} {details_mode.value} request(s), saved {max(len(phys_iface_dn) - request_count, 0)} request(s)")
 
+    return phys_iface_details
 
-def __collect_phys_iface_details(apic: Apic, phys_iface_dn: Set):
-    """collected phys interface details using threaded parallel calls"""
 
-    def calc_parallel_threads(interface_count: int, div_factor: int = 8, max_threads: int = 50) -> int:
-        candidate = interface_count // div_factor
-        return candidate if candidate < max_threads else max_threads
+def __collect_phys_iface_details(apic: Apic, phys_iface_dn: Set) -> List[PhysIfDetails]:
+    """collected phys interface details using threaded parallel calls, the requests in flight are limited by `apic.concurrency`"""
 
     def get_interface_details_wrapper(phys_iface_dn: str, apic: Apic = apic):
         return get_interface_details(phys_iface_dn, apic)
 
-    worker_threads: int = calc_parallel_threads(interface_count=len(phys_iface_dn))
+    worker_threads: int = max(min(len(phys_iface_dn), apic.concurrency.maximum), 1)
 
-    with concurrent.futures.ThreadPoolExecutor(max_workers=worker_threads) as executor:
-        return {iface["dn"]: iface for iface in list(executor.map(get_interface_details_wrapper, phys_iface_dn))}
+    with ContextThreadPoolExecutor(max_workers=worker_threads) as executor:
+        return list(executor.map(get_interface_details_wrapper, phys_iface_dn))
 
 
 def __merge_data(data: PhysicalInterfaces) -> List[InterfaceDetails]:
     merged_data = []
 
-    for iface in data.phys_iface:
-        merged_data.append(InterfaceDetails.get_interface_details(iface, data))
+    for iface, ether_stats, dot3_stats, details in join_by_interface(data.phys_iface, data.ether_stats, data.dot3_stats, data.phys_iface_details, dn=operator.attrgetter("dn")):
+        merged_data.append(InterfaceDetails.get_interface_details(iface, ether_stats, dot3_stats, details, data.missing_counter))
 
     return merged_data
 
@@ -575,22 +1820,45 @@ def __group_interface_by_host(iface_stats: List[InterfaceDetails], aci_nodes: Di
     return dict(grouped_interfaces)
 
 
-def get_pwr_stats(apic: Apic, aci_nodes: Dict):
-    # fetch data
-    rx_pwr_stats = apic.get_data_from_class("ethpmDOMRxPwrStats")
-    tx_pwr_stats = apic.get_data_from_class("ethpmDOMTxPwrStats")
-
-    tx_pwr_stats_mapping = {tx["dn"]: tx for tx in tx_pwr_stats}
+def get_pwr_stats(apic: Apic, aci_nodes: Dict, node_dn: Optional[str] = None):
+    # fetch data (of the whole fabric or only of the node `node_dn`)
+    rx_pwr_stats = apic.get_data_from_class("ethpmDOMRxPwrStats", fields=DOM_PWR_STATS_FIELDS, parent_dn=node_dn)
+    tx_pwr_stats = apic.get_data_from_class("ethpmDOMTxPwrStats", fields=DOM_PWR_STATS_FIELDS, parent_dn=node_dn)
 
     # transform
     pwr_stats_by_node = defaultdict(list)
-    for rx in rx_pwr_stats:
-        stat = DomPwrStats.get_pwr_stats(rx, tx_pwr_stats_mapping)
+    for rx, tx in join_pwr_stats(rx_pwr_stats, tx_pwr_stats):
+        stat = DomPwrStats.get_pwr_stats(rx, tx)
         pwr_stats_by_node[aci_nodes[stat.node_str]].append(stat)
 
     return pwr_stats_by_node
 
 
+def get_by_node(apic: Apic, aci_nodes: Dict[str, List[AciNode]], fetch_node: Callable[..., Dict[str, List]], on_node: Optional[Callable[[Dict[str, List]], None]] = None) -> Dict[str, List]:
+    """call `fetch_node(node_dn=...)` for every switch concurrently and merge the results (grouped by host)
+
+    Every call queries only the objects of one node, so the APIC builds one small response per switch
+    instead of a fabric wide one, and only the raw data of the nodes in progress is held in memory.
+    The result of every node is passed to `on_node` as soon as it is fetched (e.g. `PiggybackWriter.put`).
+    """
+    node_dns: List[str] = [node.dn for node in itertools.chain(aci_nodes.get("spine", []), aci_nodes.get("leaf", []))]
+    merged: Dict[str, List] = defaultdict(list)
+
+    if node_dns:
+        with ContextThreadPoolExecutor(max_workers=min(len(node_dns), apic.concurrency.maximum)) as executor:
+            futures = [executor.submit(fetch_node, node_dn=node_dn) for node_dn in node_dns]
+            for future in concurrent.futures.as_completed(futures):
+                result = future.result()
+                if on_node is not None:
+                    on_node(result)
+                for host, items in result.items():
+                    merged[host].extend(items)
+
+    LOGGING.info(f"collected the objects of {len(node_dns)} node(s) with one query per node")
+
+    return dict(merged)
+
+
 ###############################################################################
 # General helper functions                                                    #
 ###############################################################################
@@ -617,12 +1885,161 @@ def _transform_nodes_to_lookup_table(aci_nodes: Dict[str, List[AciNode]]) -> Lis
     return {node.node_str: node.name for node in node_list}
 
 
-def filter_stats(stats: List, aci_class: str, phys_iface_dn: Set):
-    return {stats["dn"]: stats for stats in stats if _strip_dn(stats["dn"], aci_class) in phys_iface_dn}
+def interface_dn(dn: str) -> Optional[str]:
+    """return the DN of the interface an object belongs to, e.g. `topology/pod-1/node-101/sys/phys-[eth1/1]/phys` -> `topology/pod-1/node-101/sys/phys-[eth1/1]`
+
+    the interface DN identifies pod, node and interface, so it is used as the key to join the objects of an interface
+    """
+    start: int = dn.find(INTERFACE_RN)
+    if start < 0:
+        return None
+    return dn[: dn.find("]", start) + 1]
+
+
+def index_by_interface(objects: Iterable[Any], dn: Callable[[Any], str] = operator.itemgetter("dn")) -> Dict[str, Any]:
+    """index objects by their interface DN, objects which do not belong to an interface are dropped"""
+    return {key: obj for obj in objects if (key := interface_dn(dn(obj))) is not None}
+
+
+def join_pwr_stats(rx_pwr_stats: Iterable[Dict], tx_pwr_stats: Iterable[Dict]) -> Iterator[Tuple[Dict, Dict]]:
+    """yield every `ethpmDOMRxPwrStats` object with the `ethpmDOMTxPwrStats` object of the same interface (or `{}` if there is none)
+
+    the tx DN differs from the rx DN only in its last RN, so a direct lookup is cheaper than `join_by_interface` here
+    """
+    tx_by_dn: Dict[str, Dict] = {tx["dn"]: tx for tx in tx_pwr_stats}
+    for rx in rx_pwr_stats:
+        yield rx, tx_by_dn.get(rx["dn"].replace("rxpower", "txpower"), {})
+
+
+def join_by_interface(objects: Iterable[Any], *others: Iterable[Any], dn: Callable[[Any], str] = operator.itemgetter("dn")) -> Iterator[Tuple[Any, ...]]:
+    """hash join of objects of different classes by their interface
+
+    every object is yielded with the objects of the same interface from each of `others` (or `None` if there is none),
+    e.g. `join_by_interface(l1_phys_if, rmon_ether_stats)` yields `(l1_phys_if_object, rmon_ether_stats_object)`.
+    The objects are dicts with a `dn` by default, records need `dn=operator.attrgetter("dn")`.
+    """
+    indexes: List[Dict[str, Any]] = [index_by_interface(other, dn) for other in others]
+    for obj in objects:
+        key: Optional[str] = interface_dn(dn(obj))
+        yield (obj, *(index.get(key) for index in indexes))
+
+
+def _apic_url(host: str) -> str:
+    return f"https://{host}/api/"
+
+
+def _fabric_id(hosts: Sequence[str]) -> str:
+    return ",".join(sorted(hosts))
+
+
+def _state_key(name: str) -> str:
+    return hashlib.sha256(name.encode()).hexdigest()[:16]
+
+
+@functools.lru_cache(maxsize=None)
+def _private_dir(path: str) -> bool:
+    """create the directory (only accessible by the current user) if it is missing, and tell if it is private
+
+    Files in a directory which is not private (e.g. created in /tmp by another user) can not be trusted,
+    the caches are not used then.
+    """
+    try:
+        os.makedirs(path, mode=0o700, exist_ok=True)
+        status = os.lstat(path)
+    except OSError as e:
+        LOGGING.warning(f"state directory {path} is not usable, no state is kept: {e}")
+        return False
+
+    if not stat.S_ISDIR(status.st_mode) or status.st_uid != os.geteuid() or status.st_mode & 0o077:
+        LOGGING.warning(f"state directory {path} is not owned by the current user or accessible by others, no state is kept")
+        return False
+    return True
+
+
+def _to_cache_json(data: Any) -> Any:
+    """the JSON representation of a fetch result, models and tuples are tagged to be restored by `_from_cache_json`"""
+    if isinstance(data, CACHED_MODELS):
+        attributes = data._asdict() if isinstance(data, tuple) else vars(data)
+        return {"__model__": type(data).__name__, "attributes": {name: _to_cache_json(value) for name, value in attributes.items()}}
+    if isinstance(data, tuple):
+        return {"__tuple__": [_to_cache_json(value) for value in data]}
+    if isinstance(data, list):
+        return [_to_cache_json(value) for value in data]
+    if isinstance(data, dict):
+        return {key: _to_cache_json(value) for key, value in data.items()}
+    if data is None or isinstance(data, (str, int, float)):
+        return data
+    raise TypeError(f"{type(data).__name__} can not be cached")
+
+
+def _from_cache_json(data: Dict) -> Any:
+    """`object_hook` of `json.load`, restores the models and tuples tagged by `_to_cache_json`"""
+    if "__model__" in data:
+        return {model.__name__: model for model in CACHED_MODELS}[data["__model__"]](**data["attributes"])
+    if "__tuple__" in data:
+        return tuple(data["__tuple__"])
+    return data
+
+
+def _default_state_dir() -> str:
+    omd_root = os.environ.get("OMD_ROOT")
+    if omd_root:
+        return os.path.join(omd_root, "tmp", "check_mk", "special_agents", "agent_cisco_aci")
+    return os.path.join(tempfile.gettempdir(), "agent_cisco_aci")
 
 
-def _strip_dn(dn: str, aci_class: str) -> str:
-    return dn.replace(aci_class, "").strip("/")
+def filter_eq(aci_class: str, attribute: str, value: str) -> str:
+    """`query-target-filter` expression selecting the objects whose attribute equals the value"""
+    return f'eq({aci_class}.{attribute},"{value}")'
+
+
+def filter_ne(aci_class: str, attribute: str, value: str) -> str:
+    """`query-target-filter` expression selecting the objects whose attribute differs from the value"""
+    return f'ne({aci_class}.{attribute},"{value}")'
+
+
+def _retry_after(response: requests.Response) -> Optional[float]:
+    """the delay requested by the `Retry-After` header (seconds or HTTP date), if any"""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    if value.strip().isdigit():
+        return float(value)
+    try:
+        return max((parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def _request_kind(endpoint: str) -> str:
+    """requests of the same kind have a comparable latency, e.g. `mo/topology/pod-#/node-#/sys/phys-[eth#/#]/phys.json`"""
+    return re.sub(r"\d+", "#", endpoint.split("?")[0])
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _errors(counter: Optional[ErrorCounter], missing: Optional[str]) -> Optional[str]:
+    """the value of an error counter, `missing` if there is no counter object or attribute"""
+    return counter.errors if counter is not None and counter.errors is not None else missing
+
+
+def _select_fields(attributes: Dict, fields: Optional[Sequence[str]]) -> Dict:
+    """reduce the attributes of an ACI object to the given fields, so only needed data is kept in memory"""
+    if not fields:
+        return attributes
+    return {field: attributes[field] for field in fields if field in attributes}
+
+
+def _add_query(endpoint: str, **query) -> str:
+    """append query parameters to an endpoint which may already contain a query string"""
+    return f"{endpoint}{'&' if '?' in endpoint else '?'}{urlencode(query)}" if query else endpoint
+
+
+def _node_dn(dn: str) -> str:
+    """return the node part of a DN, e.g. `topology/pod-1/node-101/sys/phys-[eth1/1]` -> `topology/pod-1/node-101`"""
+    return "/".join(dn.split("/")[:3])
 
 
 ###############################################################################
@@ -637,25 +2054,21 @@ def output_aci_nodes(all_nodes: Dict[str, List[AciNode]]):
                 writer.append(DEFAULT_SEPARATOR.join(node.build_node_output()))
 
 
-def output_aci_health(apic):
-    health_score = get_aci_health(apic)
+def output_aci_health(health_status: Tuple):
+    health_score, *faults = health_status
 
     with SectionWriter("aci_health", separator=DEFAULT_SEPARATOR) as writer:
-        writer.append(DEFAULT_SEPARATOR.join(("health", str(health_score), *get_faults(apic.session, apic.url))))
+        writer.append(DEFAULT_SEPARATOR.join(("health", str(health_score), *faults)))
 
 
-def output_tenants(apic: Apic):
-    tenants: List[AciTenant] = get_tenants(apic)
-
+def output_tenants(tenants: List[AciTenant]):
     with SectionWriter("aci_tenants", separator=DEFAULT_SEPARATOR) as writer:
         writer.append(AciTenant.get_header())
         for tenant in tenants:
             writer.append(tenant)
 
 
-def output_aci_version(url, session):
-    versions = get_versions(session, url)
-
+def output_aci_version(versions: List[Tuple[str, str]]):
     with SectionWriter("aci_version", separator=DEFAULT_SEPARATOR) as writer:
         for node, version in versions:
             writer.append(f"{node}{DEFAULT_SEPARATOR}{version}")
@@ -667,10 +2080,7 @@ def output_header():
         writer.append("AgentOS: Cisco ACI")
 
 
-def output_aci_class_attributes(apic: Apic, title: str, aci_class: str, fields: Tuple):
-    LOGGING.info(f"fetch and write {title} section")
-    results = apic.get_data_from_class(aci_class)
-
+def output_aci_class_attributes(results: List, title: str, fields: Tuple):
     with SectionWriter(f"aci_{title}", separator=DEFAULT_SEPARATOR) as writer:
         writer.append("#" + (DEFAULT_SEPARATOR.join(fields)))
         if isinstance(results, list):
@@ -680,60 +2090,438 @@ def output_aci_class_attributes(apic: Apic, title: str, aci_class: str, fields:
             writer.append(results)
 
 
-def output_bgp_peer_entry(apic: Apic):
+def output_bgp_peer_entry(results: List):
     output_aci_class_attributes(
-        apic,
+        results,
         title="bgp_peer_entry",
-        aci_class="bgpPeerEntry",
-        fields=(
-            "addr",
-            "connAttempts",
-            "connDrop",
-            "connEst",
-            "localIp",
-            "localPort",
-            "operSt",
-            "remotePort",
-            "type",
-        ),
+        fields=BGP_PEER_ENTRY_FIELDS,
     )
 
 
-def output_fault_inst(apic: Apic):
+def output_fault_inst(results: List):
     output_aci_class_attributes(
-        apic,
+        results,
         title="fault_inst",
-        aci_class="faultInst",
-        fields=("severity", "code", "descr", "dn", "ack"),
+        fields=FAULT_INST_FIELDS,
     )
 
 
-def output_iface_stats(apic: Apic, only_iface_admin_up: bool, aci_nodes: Dict[str, str], dns_domain: str):
-    section_name: str = "aci_l1_phys_if"
-    LOGGING.info(f"fetch and write {section_name} section")
+def output_agent_perf(statuses: List[SectionStatus], login_seconds: float, runtime: float, concurrency: ConcurrencyLimiter, controllers: List[ApicController]):
+    with SectionWriter("aci_agent_perf", separator=DEFAULT_SEPARATOR) as writer:
+        writer.append(DEFAULT_SEPARATOR.join(("login", f"{login_seconds:.3f}")))
+        for status in statuses:
+            stats = status.stats or RequestStats()
+            counts = (stats.requests, stats.response_bytes, stats.objects, stats.retries, stats.errors)
+            writer.append(DEFAULT_SEPARATOR.join(("section", status.name, status.state, f"{status.seconds:.3f}", *(str(count) for count in counts), status.detail.replace(DEFAULT_SEPARATOR, " "))))
+        writer.append(DEFAULT_SEPARATOR.join(("concurrency", str(concurrency.limit), str(concurrency.peak), str(concurrency.decreases))))
+        for controller in controllers:
+            writer.append(DEFAULT_SEPARATOR.join(("controller", controller.url, *(str(stat) for stat in controller.connection_stats()))))
+        writer.append(DEFAULT_SEPARATOR.join(("runtime", f"{runtime:.3f}")))
+
+
+class PiggybackWriter:
+    """write all piggyback sections of a node in a single piggyback block, as soon as the block is complete
+
+    The sections (name -> header row) are fed by `put` with the rows grouped by node, either all at once or
+    node by node while they are fetched. A writer thread drains the queue and writes the block of a node when
+    every section has either delivered the rows of this node or is `done`, the remaining blocks are written
+    on `close`. Rows of a section which are put again for the same node (e.g. the complete result after the
+    node by node results) are ignored. The blocks are written in the order they are complete. With a `profiler`,
+    writing the blocks is profiled as `piggyback_writer`.
+    """
+
+    def __init__(self, sections: Dict[str, str], dns_domain: str, profiler: Optional["SectionProfiler"] = None) -> None:
+        self.sections = sections
+        self.dns_domain = dns_domain
+        self.blocks_written: int = 0
+        self._queue: queue.Queue = queue.Queue()
+        self._pending: Dict[str, Dict[str, Tuple[List, Optional[Tuple[float, int]]]]] = defaultdict(dict)
+        self._written: Set[str] = set()
+        self._done: Set[str] = set()
+        self._error: Optional[Exception] = None
+        self._thread = threading.Thread(target=self._run, name="piggyback-writer", daemon=True)
+        if profiler is not None:
+            self._write_block = profiler.profiled("piggyback_writer", "write", self._write_block, trace_memory=False)
+
+    def __enter__(self) -> "PiggybackWriter":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def put(self, section: str, rows_by_node: Dict[str, List], cached: Optional[Tuple[float, int]] = None) -> None:
+        """queue the rows of a section for some or all nodes, `cached` is the (timestamp, interval) of cached rows"""
+        for node, rows in rows_by_node.items():
+            self._queue.put((section, node, rows, cached))
+
+    def done(self, section: str) -> None:
+        """all rows of a section are put"""
+        self._queue.put((section, None, None, None))
+
+    def write(self, section: str, rows_by_node: Dict[str, List]) -> None:
+        self.put(section, rows_by_node)
+        self.done(section)
+
+    def write_cached(self, section: str, rows_by_node: Dict[str, List], timestamp: float, interval: int) -> None:
+        self.put(section, rows_by_node, cached=(timestamp, interval))
+        self.done(section)
+
+    def close(self) -> None:
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def _complete(self, node: str) -> bool:
+        return all(section in self._pending[node] or section in self._done for section in self.sections)
+
+    def _run(self) -> None:
+        try:
+            while (item := self._queue.get()) is not None:
+                section, node, rows, cached = item
+                if node is None:
+                    self._done.add(section)
+                    for node in [node for node in self._pending if self._complete(node)]:
+                        self._write_block(node)
+                elif node not in self._written and section not in self._pending[node]:
+                    self._pending[node][section] = (rows, cached)
+                    if self._complete(node):
+                        self._write_block(node)
+
+            for node in list(self._pending):
+                self._write_block(node)
+        except Exception as e:
+            self._error = e
+
+    def _write_block(self, node: str) -> None:
+        block = self._pending.pop(node)
+        self._written.add(node)
+
+        with OUTPUT_LOCK, ConditionalPiggybackSection(f"{node}.{self.dns_domain}" if self.dns_domain else node):
+            for section, header in self.sections.items():
+                if section not in block:
+                    continue
+                rows, cached = block[section]
+                write = functools.partial(self._write_section, section, header)
+                if cached:
+                    write_cached(write, rows, *cached)
+                else:
+                    write(rows)
+        self.blocks_written += 1
+
+    @staticmethod
+    def _write_section(section: str, header: str, rows: List) -> None:
+        with SectionWriter(section, separator=DEFAULT_SEPARATOR) as writer:
+            writer.append(header)
+            for row in rows:
+                writer.append(row)
+
+
+###############################################################################
+# Section scheduling                                                          #
+###############################################################################
+
+
+class SectionTask(NamedTuple):
+    """an agent section consisting of a fetcher (talks to the APIC) and a writer (writes to stdout)
 
-    iface_stats: Dict[str, List] = get_phys_iface(apic, only_iface_admin_up, aci_nodes)
+    the fetcher is called with the fetch results of all sections listed in `depends_on` (in this order),
+    the writer is called with the result of the fetcher.
+    """
+
+    name: str
+    fetch: Callable[..., Any]
+    write: Callable[[Any], None]
+    depends_on: Tuple[str, ...] = ()
+    write_cached: Optional[Callable[[Any, float, int], None]] = None  # writer for cached results, by default the headers written by `write` are rewritten
+    cache_ttl: int = 0  # reuse the fetch result of a previous run for this many seconds (0 = always fetch)
+    budget: float = 0  # seconds the fetcher may take (0 = limited by the deadline of the run only)
+
+
+def write_cached(write: Callable[[Any], None], data: Any, timestamp: float, interval: int) -> None:
+    """write section(s) with `cached(timestamp,interval)` headers, so Checkmk knows the age of the data"""
+    with io.StringIO() as buffer:
+        with redirect_stdout(buffer):
+            write(data)
+        sys.stdout.write(SECTION_HEADER.sub(rf"\1:cached({int(timestamp)},{interval})", buffer.getvalue()))
+
+
+class SectionProfiler:
+    """profile the fetcher and the writer of every section, written to one file per section and tool
+
+    With a `profile_dir`, the calls are profiled with cProfile and written as `<section>.prof` (for pstats,
+    snakeviz, ...) and `<section>.txt` (the top functions by cumulative time). The calls a fetcher runs in
+    a ContextThreadPoolExecutor are added to the profile of its section (on Python 3.12+, the profile of the
+    section covers all threads anyway). The piggyback sections are written by the `PiggybackWriter` thread,
+    which is profiled as `piggyback_writer` instead.
+
+    With a `tracemalloc_dir`, the peak memory and the memory still held after each call is written with the
+    top allocation sites as `<section>.tracemalloc.txt`. tracemalloc traces the whole process, so the sections
+    are fetched one after another while profiling, and the figures of a section include the allocations of the
+    piggyback writer thread at the same time.
+    """
 
-    for node, iface in iface_stats.items():
-        with ConditionalPiggybackSection(f"{node}.{dns_domain}" if dns_domain else node):
-            with SectionWriter(section_name, separator=DEFAULT_SEPARATOR) as writer:
-                writer.append(InterfaceDetails.get_header())
-                for line in iface:
-                    writer.append(line)
+    TOP: int = 30
+
+    def __init__(self, profile_dir: Optional[str], tracemalloc_dir: Optional[str]) -> None:
+        self.profile_dir = profile_dir
+        self.tracemalloc_dir = tracemalloc_dir
+        self._profiles: Dict[str, List[cProfile.Profile]] = defaultdict(list)  # one per profiled call and thread
+        self._memory_reports: Dict[str, List[str]] = defaultdict(list)
+        self._lock = threading.Lock()
+
+        for directory in (profile_dir, tracemalloc_dir):
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        if tracemalloc_dir:
+            tracemalloc.start()
+
+    def wrap(self, task: SectionTask, write: bool = True) -> SectionTask:
+        """the task with its fetcher and writer(s) profiled, the writers only if `write` (not for piggyback sections)"""
+        task = task._replace(fetch=self.profiled(task.name, "fetch", task.fetch))
+        if not write:
+            return task
+        return task._replace(
+            write=self.profiled(task.name, "write", task.write),
+            write_cached=self.profiled(task.name, "write", task.write_cached) if task.write_cached else None,
+        )
+
+    def profiled(self, section: str, phase: str, function: Callable[..., Any], trace_memory: bool = True) -> Callable[..., Any]:
+        @functools.wraps(function)
+        def profiled(*args, **kwargs) -> Any:
+            with self._measure(section, phase, trace_memory):
+                return function(*args, **kwargs)
 
+        return profiled
 
-def output_dom_rx_pwr_stats(apic: Apic, aci_nodes: Dict[str, str], dns_domain: str):
-    section_name: str = "aci_dom_pwr_stats"
-    LOGGING.info(f"fetch and write {section_name} section")
+    def _profiled_thread(self, section: str, function: Callable[..., Any]) -> Callable[..., Any]:
+        """the call in a worker thread of the section, see `THREAD_PROFILER`"""
 
-    pwr_stats_by_node = get_pwr_stats(apic, aci_nodes)
+        @functools.wraps(function)
+        def profiled(*args, **kwargs) -> Any:
+            profile = self._start_profile(section)
+            try:
+                return function(*args, **kwargs)
+            finally:
+                if profile is not None:
+                    profile.disable()
+
+        return profiled
+
+    def _start_profile(self, section: str) -> Optional[cProfile.Profile]:
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # only one profiler can be active at a time (Python 3.12+), which covers all threads
+            return None
+        with self._lock:
+            self._profiles[section].append(profile)
+        return profile
+
+    @contextmanager
+    def _measure(self, section: str, phase: str, trace_memory: bool) -> Iterator[None]:
+        trace_memory = trace_memory and bool(self.tracemalloc_dir)
+        if trace_memory:
+            before = self._snapshot()
+            tracemalloc.reset_peak()
+            before_size, _ = tracemalloc.get_traced_memory()
+
+        profile: Optional[cProfile.Profile] = None
+        thread_profiler: Optional[contextvars.Token] = None
+        if self.profile_dir:
+            profile = self._start_profile(section)
+            if profile is None:
+                LOGGING.info(f"could not profile {phase} of {section} section, another profiler is active")
+            thread_profiler = THREAD_PROFILER.set(functools.partial(self._profiled_thread, section))
+
+        try:
+            yield
+        finally:
+            if thread_profiler is not None:
+                THREAD_PROFILER.reset(thread_profiler)
+            if profile is not None:
+                profile.disable()
+            if trace_memory:
+                size, peak = tracemalloc.get_traced_memory()
+                self._memory_reports[section].append(self._memory_report(phase, before, size - before_size, peak - before_size))
 
-    for node, pwr_stats in pwr_stats_by_node.items():
-        with ConditionalPiggybackSection(f"{node}.{dns_domain}" if dns_domain else node):
-            with SectionWriter(section_name, separator=DEFAULT_SEPARATOR) as writer:
-                writer.append(DomPwrStats.get_header())
-                for stat in pwr_stats:
-                    writer.append(stat)
+    @staticmethod
+    def _snapshot() -> tracemalloc.Snapshot:
+        """snapshot of the traced memory, without the memory of earlier snapshots"""
+        return tracemalloc.take_snapshot().filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),))
+
+    def _memory_report(self, phase: str, before: tracemalloc.Snapshot, held: int, peak: int) -> str:
+        statistics = self._snapshot().compare_to(before, "lineno")
+        lines = [f"{phase}: peak {peak / 1024:.1f} KiB, held {held / 1024:.1f} KiB afterwards, top allocation sites:"]
+        lines.extend(f"  {statistic}" for statistic in statistics[: self.TOP])
+        return "\n".join(lines)
+
+    def close(self) -> None:
+        """write the files of all sections"""
+        for section, profiles in self._profiles.items():
+            with open(os.path.join(self.profile_dir, f"{section}.txt"), "w") as f:
+                stats = pstats.Stats(*profiles, stream=f)
+                stats.dump_stats(os.path.join(self.profile_dir, f"{section}.prof"))
+                stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.TOP)
+
+        for section, reports in self._memory_reports.items():
+            with open(os.path.join(self.tracemalloc_dir, f"{section}.tracemalloc.txt"), "w") as f:
+                f.write("\n\n".join(reports) + "\n")
+
+        if self.tracemalloc_dir:
+            tracemalloc.stop()
+        LOGGING.info(f"wrote profiles of {len(self._profiles | self._memory_reports)} section(s)")
+
+
+def run_sections(
+    tasks: Sequence[SectionTask],
+    max_workers: int,
+    section_cache: Optional[SectionCache] = None,
+    stale_max_age: int = 0,
+    deadline: Optional[float] = None,
+    plan: Optional[Callable[[List[str]], None]] = None,
+) -> List[SectionStatus]:
+    """run the fetchers of all tasks concurrently and write the sections in the given order
+
+    A fetcher is started as soon as all of its dependencies are fetched. A section is written as soon as
+    it is fetched and all sections before it are written, which keeps the agent output deterministic.
+    Sections with a `cache_ttl` are taken from the section cache as long as they are valid. `plan` (e.g.
+    `QueryPlanner.plan`) is called with the sections which are fetched, before the first fetcher starts.
+
+    With a `stale_max_age`, the result of every fetch is kept in the section cache. If a fetcher fails,
+    the last result (if not older than `stale_max_age`) is written with its real age instead, otherwise
+    the section and all sections depending on it are skipped. Without, a failing fetcher is fatal.
+    The requests of every fetcher are counted in the `RequestStats` of its status.
+
+    A fetcher has to be done within the `budget` of its task and before the `deadline` (`time.monotonic()`)
+    of the run. Both are enforced on every HTTP request of the fetcher, and a fetcher still running
+    `DEADLINE_GRACE` seconds later is abandoned. A fetcher running out of time is never fatal, it is
+    handled like a failing fetcher with `stale_max_age`.
+    """
+    names: Set[str] = {task.name for task in tasks}
+    for task in tasks:
+        unknown = set(task.depends_on) - names
+        if unknown:
+            raise ValueError(f"section {task.name} depends on unknown section(s) {', '.join(sorted(unknown))}")
+
+    waiting: List[SectionTask] = list(tasks)
+    running: Dict[concurrent.futures.Future, Tuple[SectionTask, float, Optional[float]]] = {}  # task, start and deadline of the fetcher
+    results: Dict[str, Any] = {}
+    cached_at: Dict[str, Tuple[float, int]] = {}  # sections written with a cached(timestamp,interval) header
+    failed: Set[str] = set()
+    written: Set[str] = set()
+    statuses: Dict[str, SectionStatus] = {}
+    stats: Dict[str, RequestStats] = {}
+    next_to_write: int = 0
+
+    def fail(task: SectionTask, error: Exception, seconds: float) -> None:
+        if stale_max_age > 0 and section_cache is not None:
+            stale = section_cache.load(task.name, stale_max_age)
+            if stale is not None:
+                LOGGING.info(f"use stale {task.name} section of {int(time.time() - stale[0])}s ago..")
+                timestamp, results[task.name] = stale
+                cached_at[task.name] = (timestamp, stale_max_age)
+                statuses[task.name] = SectionStatus(task.name, "stale", seconds, str(error))
+                return
+        elif not isinstance(error, requests.exceptions.Timeout):
+            raise error
+
+        failed.add(task.name)
+        statuses[task.name] = SectionStatus(task.name, "skipped", seconds, str(error))
+
+    if section_cache is not None:
+        for task in [task for task in waiting if task.cache_ttl > 0]:
+            cached = section_cache.load(task.name, task.cache_ttl)
+            if cached is not None:
+                LOGGING.info(f"use cached {task.name} section..")
+                waiting.remove(task)
+                timestamp, results[task.name] = cached
+                cached_at[task.name] = (timestamp, task.cache_ttl)
+                statuses[task.name] = SectionStatus(task.name, "cached")
+    if plan is not None:
+        plan([task.name for task in waiting])
+
+    # an abandoned fetcher keeps its thread until its HTTP request times out, so the pool has a thread
+    # for every task and the number of concurrent fetchers is limited by the scheduler instead
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=max(len(tasks), 1))
+    try:
+        while next_to_write < len(tasks):
+            for task in [task for task in waiting if any(dep in failed for dep in task.depends_on)]:
+                LOGGING.error(f"skip {task.name} section, as a section it depends on failed")
+                waiting.remove(task)
+                failed.add(task.name)
+                statuses[task.name] = SectionStatus(task.name, "skipped", detail=f"depends on {', '.join(dep for dep in task.depends_on if dep in failed)}")
+
+            now = time.monotonic()
+            for task in [task for task in waiting if all(dep in results for dep in task.depends_on)]:
+                if len(running) >= max(max_workers, 1):
+                    break
+                waiting.remove(task)
+                task_deadline = min((t for t in (deadline, now + task.budget if task.budget > 0 else None) if t is not None), default=None)
+                if task_deadline is not None and task_deadline <= now:
+                    LOGGING.error(f"skip {task.name} section, the deadline of the run is exceeded")
+                    fail(task, DeadlineExceeded("deadline of the run exceeded before the section was started"), 0.0)
+                    continue
+
+                LOGGING.info(f"fetch {task.name} section..")
+                context = contextvars.copy_context()
+                context.run(DEADLINE.set, task_deadline)
+                context.run(REQUEST_STATS.set, stats.setdefault(task.name, RequestStats(task.name)))
+                running[executor.submit(context.run, task.fetch, *(results[dep] for dep in task.depends_on))] = (task, now, task_deadline)
+
+            deadlines = [task_deadline for _, _, task_deadline in running.values() if task_deadline is not None]
+            timeout = max(min(deadlines) + DEADLINE_GRACE - now, 0) if deadlines else None
+            done, _ = concurrent.futures.wait(running, timeout=timeout, return_when=concurrent.futures.FIRST_COMPLETED)
+
+            now = time.monotonic()
+            for future in done:
+                task, start, _ = running.pop(future)
+                try:
+                    results[task.name] = future.result()
+                except Exception as e:
+                    LOGGING.error(f"could not fetch {task.name} section: {e}")
+                    fail(task, e, now - start)
+                    continue
+
+                statuses[task.name] = SectionStatus(task.name, "ok", now - start)
+                if section_cache is not None and (task.cache_ttl > 0 or stale_max_age > 0):
+                    timestamp = time.time()
+                    section_cache.store(task.name, timestamp, results[task.name])
+                    if task.cache_ttl > 0:
+                        cached_at[task.name] = (timestamp, task.cache_ttl)
+
+            for future, (task, start, task_deadline) in list(running.items()):
+                if task_deadline is not None and now >= task_deadline + DEADLINE_GRACE:
+                    LOGGING.error(f"abandon {task.name} section, its time is up")
+                    del running[future]
+                    fail(task, DeadlineExceeded(f"no result after {now - start:.1f}s"), now - start)
+
+            while next_to_write < len(tasks) and tasks[next_to_write].name in results.keys() | failed:
+                task = tasks[next_to_write]
+                if task.name in cached_at and task.write_cached is not None:
+                    LOGGING.info(f"write {task.name} section..")
+                    task.write_cached(results[task.name], *cached_at[task.name])
+                elif task.name in cached_at:
+                    LOGGING.info(f"write {task.name} section..")
+                    with OUTPUT_LOCK:
+                        write_cached(task.write, results[task.name], *cached_at[task.name])
+                elif task.name in results:
+                    LOGGING.info(f"write {task.name} section..")
+                    with OUTPUT_LOCK:
+                        task.write(results[task.name])
+                written.add(task.name)
+                next_to_write += 1
+
+            # free fetch results which are written and not needed by waiting fetchers anymore
+            for name in [name for name in results if name in written and not any(name in task.depends_on for task in waiting)]:
+                del results[name]
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return [statuses[task.name]._replace(stats=stats.get(task.name)) for task in tasks]
 
 
 ###############################################################################
@@ -744,47 +2532,111 @@ def output_dom_rx_pwr_stats(apic: Apic, aci_nodes: Dict[str, str], dns_domain: s
 def agent_cisco_aci_main(args: Args) -> None:
     """Establish a connection to ACI controller and get version, health, and node information"""
 
+    start = time.monotonic()
+    if args.deadline > 0:
+        DEADLINE.set(start + args.deadline)
+
     LOGGING.info("Setup HTTPS connection..")
     apic = Apic(args)
-    url, session = apic.url, apic.session
 
     LOGGING.info("Write agent header..")
     output_header()
 
-    LOGGING.info("Fetch and write version info..")
-    output_aci_version(url, session)
-
-    LOGGING.info("Fetch and write health status..")
-    output_aci_health(apic)
-
-    LOGGING.info("Fetch and write tenants..")
-    output_tenants(apic)
+    # the objects of these sections are fetched with one subtree query per scope (the fault counters are no class)
+    planner = QueryPlanner(
+        apic,
+        {
+            "aci_version": QueryNeed(("firmwareCtrlrRunning", "firmwareRunning")),
+            "aci_health": QueryNeed(("fabricHealthTotal",)),
+            "aci_tenants": QueryNeed(("fvTenant",), scope="uni", include=("health",)),
+            "aci_nodes": QueryNeed(("topSystem",), children=("eqptCh",), include=("health",)),
+        },
+    )
 
-    LOGGING.info("Fetch and write node info..")
-    all_nodes = get_nodes(apic)
-    output_aci_nodes(all_nodes)
+    tasks: List[SectionTask] = [
+        SectionTask("aci_version", fetch=functools.partial(get_versions, planner), write=output_aci_version),
+        SectionTask("aci_health", fetch=functools.partial(get_health_status, planner), write=output_aci_health),
+        SectionTask("aci_tenants", fetch=functools.partial(get_tenants, planner), write=output_tenants),
+        SectionTask("aci_nodes", fetch=functools.partial(get_nodes, planner), write=output_aci_nodes),
+    ]
 
     if not args.skip_bgp_peer_entry:
-        output_bgp_peer_entry(apic)
+        tasks.append(SectionTask("aci_bgp_peer_entry", fetch=functools.partial(apic.get_data_from_class, "bgpPeerEntry", BGP_PEER_ENTRY_FIELDS), write=output_bgp_peer_entry))
 
     if not args.skip_fault_inst:
-        output_fault_inst(apic)
+        fault_filter: Optional[str] = filter_ne("faultInst", "severity", "cleared") if args.skip_cleared_faults else None
+        tasks.append(SectionTask("aci_fault_inst", fetch=functools.partial(apic.get_data_from_class, "faultInst", FAULT_INST_FIELDS, fault_filter), write=output_fault_inst))
 
+    # the interfaces and DOM power stats are written per node, with the sections of a node in one piggyback block
+    piggyback_sections: Dict[str, str] = {}
     if not args.skip_l1_phys_if:
-        output_iface_stats(
+        piggyback_sections["aci_l1_phys_if"] = InterfaceDetails.get_header()
+    if not args.skip_dom_pwr_stats:
+        piggyback_sections["aci_dom_pwr_stats"] = DomPwrStats.get_header()
+    profiler = SectionProfiler(args.profile, args.tracemalloc) if args.profile or args.tracemalloc else None
+    piggyback = PiggybackWriter(piggyback_sections, args.dns_domain, profiler)
+
+    def fetch_phys_iface(all_nodes: Dict[str, List[AciNode]]) -> Dict[str, List]:
+        fetch = functools.partial(
+            get_phys_iface,
             apic,
             args.only_iface_admin_up,
             aci_nodes=_transform_nodes_to_lookup_table(all_nodes),
-            dns_domain=args.dns_domain,
+            details_mode=IfaceDetailsMode(args.iface_details_mode),
+            only_nonzero_counters=args.only_nonzero_counters,
+        )
+        return get_by_node(apic, all_nodes, fetch, on_node=functools.partial(piggyback.put, "aci_l1_phys_if")) if args.shard_by_node else fetch()
+
+    def fetch_pwr_stats(all_nodes: Dict[str, List[AciNode]]) -> Dict[str, List]:
+        fetch = functools.partial(get_pwr_stats, apic, aci_nodes=_transform_nodes_to_lookup_table(all_nodes))
+        return get_by_node(apic, all_nodes, fetch, on_node=functools.partial(piggyback.put, "aci_dom_pwr_stats")) if args.shard_by_node else fetch()
+
+    if not args.skip_l1_phys_if:
+        tasks.append(
+            SectionTask(
+                "aci_l1_phys_if",
+                fetch=fetch_phys_iface,
+                write=functools.partial(piggyback.write, "aci_l1_phys_if"),
+                write_cached=functools.partial(piggyback.write_cached, "aci_l1_phys_if"),
+                depends_on=("aci_nodes",),
+            )
         )
 
     if not args.skip_dom_pwr_stats:
-        output_dom_rx_pwr_stats(
-            apic,
-            aci_nodes=_transform_nodes_to_lookup_table(all_nodes),
-            dns_domain=args.dns_domain,
+        tasks.append(
+            SectionTask(
+                "aci_dom_pwr_stats",
+                fetch=fetch_pwr_stats,
+                write=functools.partial(piggyback.write, "aci_dom_pwr_stats"),
+                write_cached=functools.partial(piggyback.write_cached, "aci_dom_pwr_stats"),
+                depends_on=("aci_nodes",),
+            )
         )
 
+    cache_ttls: Dict[str, int] = dict(args.cache_ttl)
+    budgets: Dict[str, int] = dict(args.section_budget)
+    tasks = [task._replace(cache_ttl=cache_ttls.get(task.name, 0), budget=budgets.get(task.name, 0)) for task in tasks]
+
+    section_workers: int = args.section_workers
+    if profiler is not None:
+        # the profiles and memory figures of concurrent sections would be mixed up
+        LOGGING.info("fetch the sections one after another while profiling..")
+        tasks = [profiler.wrap(task, write=task.name not in piggyback_sections) for task in tasks]
+        section_workers = 1
+
+    section_cache = SectionCache(args.state_dir, args.host) if cache_ttls or args.stale_max_age > 0 else None
+    with piggyback:
+        statuses = run_sections(tasks, max_workers=section_workers, section_cache=section_cache, stale_max_age=args.stale_max_age, deadline=DEADLINE.get(), plan=planner.plan)
+    LOGGING.info(f"wrote {piggyback.blocks_written} piggyback block(s)")
+    if profiler is not None:
+        profiler.close()
+    output_agent_perf(statuses, apic.login_seconds, time.monotonic() - start, apic.concurrency, apic.controllers)
+    LOGGING.info(f"requests in flight limited to {apic.concurrency.limit} (peak {apic.concurrency.peak}, {apic.concurrency.decreases} decrease(s))")
+    apic.log_request_distribution()
+    apic.close()
+    if apic.tracer is not None:
+        apic.tracer.write(args.trace_file)
+
     LOGGING.info("All done. cheers.")
 
 
@@ -798,17 +2650,59 @@ def main() -> int:
 ###############################################################################
 
 
+def _section_seconds(sections: Tuple) -> Callable[[str], Tuple[str, int]]:
+    """argument type of SECTION=SECONDS arguments"""
+
+    def parse(value: str) -> Tuple[str, int]:
+        name, _, seconds = value.partition("=")
+        if name not in sections or not seconds.isdigit():
+            raise argparse.ArgumentTypeError(f"expected SECTION=SECONDS with SECTION one of {', '.join(sections)}, got {value!r}")
+        return name, int(seconds)
+
+    return parse
+
+
 def parse_arguments(argv: Optional[Sequence[str]]) -> Args:
     parser = create_default_argument_parser(description=__doc__)
     parser.add_argument("-H", "--host", type=str, required=True, metavar="HOST", nargs="+", help="APIC IP, multiple IPs (Ctrls) accepted")
     parser.add_argument("-D", "--dns-domain", type=str, required=False, metavar="DOMAIN", help="DNS domain of nodes (used to correctly name piggyback hosts)")
     parser.add_argument("-u", "--user", type=str, required=True, metavar="USER", help="ACI Username")
-    parser.add_argument("-p", "--password", type=str, required=True, metavar="PASSWORD", help="ACI Password")
+    parser.add_argument("-p", "--password", type=str, required=False, metavar="PASSWORD", help="ACI Password")
+    parser.add_argument("--cert-name", type=str, required=False, metavar="NAME", help="name of the X.509 certificate of the user on the APIC, requests are signed with --private-key instead of logging in with --password")
+    parser.add_argument("--private-key", type=str, required=False, metavar="FILE", help="PEM file with the private key of the user certificate given by --cert-name")
+    parser.add_argument("--load-balance", type=str, required=False, choices=[mode.value for mode in LoadBalanceMode], default=LoadBalanceMode.FAILOVER.value, help="use the first reachable APIC only, or log into all APICs and spread the requests over them")
+    parser.add_argument("--state-dir", type=str, required=False, default=_default_state_dir(), metavar="DIR", help="directory for data kept between agent runs, like cached APIC sessions")
+    parser.add_argument("--no-session-cache", dest="session_cache", action="store_false", required=False, default=True, help="always log in, instead of reusing (and refreshing) the APIC session of the previous run")
     parser.add_argument("--only-iface-admin-up", action="store_true", required=False, default=False, help='Only monitor interfaces in admin state "up"')
+    parser.add_argument("--iface-details-mode", type=str, required=False, choices=[mode.value for mode in IfaceDetailsMode], default=IfaceDetailsMode.CLASS.value, help="collect ethpmPhysIf details per interface, with one fabric wide class query or with one class query per node")
+
+    parser.add_argument("--page-size", type=int, required=False, default=0, metavar="N", help="fetch class queries in pages of N objects, the pages after the first one are fetched concurrently (0 = no paging)")
+    parser.add_argument("--stream-json", action="store_true", required=False, default=False, help="decode class query responses incrementally while they are downloaded (bounded memory for large classes)")
+    parser.add_argument("--cache-ttl", type=_section_seconds(CACHEABLE_SECTIONS), required=False, action="append", default=[], metavar="SECTION=SECONDS", help=f"reuse the data of a slowly changing section for this many seconds, instead of fetching it in every run ({', '.join(CACHEABLE_SECTIONS)})")
+    parser.add_argument("--stale-max-age", type=int, required=False, default=0, metavar="SECONDS", help="keep the data of every section, and write the last data (if not older than SECONDS) of a section which can not be fetched, instead of failing (0 = disabled)")
+    parser.add_argument("--deadline", type=float, required=False, default=0, metavar="SECONDS", help="time for the whole run, enforced on every HTTP request; sections not done in time are written stale or skipped (0 = no deadline)")
+    parser.add_argument("--section-budget", type=_section_seconds(SECTIONS), required=False, action="append", default=[], metavar="SECTION=SECONDS", help="time the section may take, within the deadline of the run")
+    parser.add_argument("--max-concurrency", type=int, required=False, default=MAX_CONCURRENCY, metavar="N", help="upper limit of requests in flight to the APIC, the actual limit adapts to the latency and the 429/503 responses of the APIC")
+    parser.add_argument("--max-retries", type=int, required=False, default=MAX_RETRIES, metavar="N", help="retries of a request after a connection error, a timeout or a 429/5xx response, with exponential backoff (0 = no retries)")
+    parser.add_argument("--trace-file", type=str, required=False, metavar="FILE", help="write every HTTP request to the APIC with its thread, section and timing to FILE, in the Chrome trace event format (chrome://tracing, ui.perfetto.dev)")
+    parser.add_argument("--record-dir", type=str, required=False, metavar="DIR", help="write the URL and the (gzip compressed) response of every request to the APIC to DIR, with the session tokens scrubbed, to reproduce the responses offline")
+    parser.add_argument("--profile", type=str, required=False, metavar="DIR", help="profile the fetcher and writer of every section with cProfile, written as <section>.prof and <section>.txt to DIR (the sections are fetched one after another)")
+    parser.add_argument("--tracemalloc", type=str, required=False, metavar="DIR", help="trace the memory allocations of the fetcher and writer of every section, the peak memory and the top allocation sites are written as <section>.tracemalloc.txt to DIR (the sections are fetched one after another)")
+    parser.add_argument("--section-workers", type=int, required=False, default=4, metavar="N", help="number of sections fetched concurrently from the APIC (1 = one after another)")
 
     parser.add_argument("--skip-bgp-peer-entry", action="store_true", required=False, default=False, help="skip processing section aci_bgp_peer_entry")
+    parser.add_argument("--shard-by-node", action="store_true", required=False, default=False, help="query the interfaces and DOM power stats with one query per switch node instead of fabric wide class queries")
+    parser.add_argument("--only-nonzero-counters", action="store_true", required=False, default=False, help="let the APIC send only interface error counters which are not zero (missing counters are reported as 0)")
+    parser.add_argument("--skip-cleared-faults", action="store_true", required=False, default=False, help="let the APIC send only faults which are not cleared (the cleared alarms are not counted anymore)")
     parser.add_argument("--skip-fault-inst", action="store_true", required=False, default=False, help="skip processing section aci_fault_inst")
     parser.add_argument("--skip-l1-phys-if", action="store_true", required=False, default=False, help="skip processing section aci_l1_phys_if")
     parser.add_argument("--skip-dom-pwr-stats", action="store_true", required=False, default=False, help="skip processing section aci_dom_pwr_stats")
 
-    return parser.parse_args(argv)
+    args = parser.parse_args(argv)
+
+    if args.cert_name and not args.private_key:
+        parser.error("--cert-name requires --private-key")
+    if not args.cert_name and not args.password:
+        parser.error("either --password or --cert-name and --private-key are required")
+
+    return args
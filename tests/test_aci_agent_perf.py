@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# This is free software;  you can redistribute it and/or modify it
+# under the  terms of the  GNU General Public License  as published by
+# the Free Software Foundation in version 2.  check_mk is  distributed
+# in the hope that it will be useful, but WITHOUT ANY WARRANTY;  with-
+# out even the implied warranty of  MERCHANTABILITY  or  FITNESS FOR A
+# PARTICULAR PURPOSE. See the  GNU General Public License for more de-
+# tails. You should have  received  a copy of the  GNU  General Public
+# License along with GNU Make; see the file  COPYING.  If  not,  write
+# to the Free Software Foundation, Inc., 51 Franklin St,  Fifth Floor,
+# Boston, MA 02110-1301 USA.
+
+from typing import List
+
+import pytest
+from cmk.agent_based.v2 import Metric, Result, State
+
+from cmk_addons.plugins.cisco_aci.agent_based.aci_agent_perf import (
+    DEFAULT_AGENT_PERF_LEVELS,
+    AgentPerf,
+    Concurrency,
+    ControllerStats,
+    SectionPerf,
+    check_aci_agent_perf,
+    parse_aci_agent_perf,
+)
+
+SECTION = AgentPerf(
+    login_seconds=0.099,
+    runtime=0.4,
+    sections=[
+        SectionPerf("aci_version", "ok", 0.059, 1, 3863, 20, 0, 0),
+        SectionPerf("aci_nodes", "cached", 0.0, 0, 0, 0, 0, 0),
+        SectionPerf("aci_fault_inst", "ok", 0.295, 3, 6702, 40, 2, 2),
+        SectionPerf("aci_l1_phys_if", "ok", 0.183, 4, 219696, 1152, 0, 0),
+    ],
+    concurrency=Concurrency(8, 16, 1),
+    controllers=(ControllerStats("https://10.1.1.1/api/", 5, 2), ControllerStats("https://10.1.1.2/api/", 3, 1)),
+)
+
+
+@pytest.mark.parametrize(
+    "string_table, expected_section",
+    [
+        (
+            [
+                ["login", "0.099"],
+                ["section", "aci_version", "ok", "0.059", "1", "3863", "20", "0", "0", ""],
+                ["section", "aci_nodes", "cached", "0.000", "0", "0", "0", "0", "0", ""],
+                ["section", "aci_fault_inst", "ok", "0.295", "3", "6702", "40", "2", "2", ""],
+                ["section", "aci_l1_phys_if", "ok", "0.183", "4", "219696", "1152", "0", "0", ""],
+                ["concurrency", "8", "16", "1"],
+                ["controller", "https://10.1.1.1/api/", "5", "2"],
+                ["controller", "https://10.1.1.2/api/", "3", "1"],
+                ["runtime", "0.400"],
+            ],
+            SECTION,
+        ),
+        (
+            [["login", "1.5"], ["runtime", "2.0"]],
+            AgentPerf(1.5, 2.0, []),
+        ),
+        (
+            # written by agents without concurrency, controllers and section details
+            [["login", "1.5"], ["section", "aci_version", "ok", "0.059", "1", "3863", "20", "0", "0"], ["runtime", "2.0"]],
+            AgentPerf(1.5, 2.0, [SectionPerf("aci_version", "ok", 0.059, 1, 3863, 20, 0, 0)]),
+        ),
+    ],
+)
+def test_parse_aci_agent_perf(string_table: List[List[str]], expected_section: AgentPerf) -> None:
+    assert parse_aci_agent_perf(string_table) == expected_section
+
+
+def test_check_aci_agent_perf_totals() -> None:
+    results = list(check_aci_agent_perf(DEFAULT_AGENT_PERF_LEVELS, SECTION))
+
+    metrics = {result.name: result.value for result in results if isinstance(result, Metric)}
+    assert metrics == {
+        "aci_agent_runtime": 0.4,
+        "aci_agent_login_time": 0.099,
+        "aci_agent_requests": 8,
+        "aci_agent_response_bytes": 230261,
+        "aci_agent_objects": 1212,
+        "aci_agent_retries": 2,
+        "aci_agent_errors": 2,
+    }
+    assert all(result.state == State.OK for result in results if isinstance(result, Result))
+    assert any(result.summary.startswith("Slowest section: aci_fault_inst") for result in results if isinstance(result, Result))
+    # one line per section in the details
+    assert len([result for result in results if isinstance(result, Result) and result.details.startswith("aci_")]) == 4
+    assert any(result.details == "Requests in flight: limit 8, peak 16, 1 decreases on congestion" for result in results if isinstance(result, Result))
+    assert any(result.details == "https://10.1.1.2/api/: 3 requests over 1 connections" for result in results if isinstance(result, Result))
+
+
+@pytest.mark.parametrize(
+    "params, runtime, expected_state",
+    [
+        (DEFAULT_AGENT_PERF_LEVELS, 44.9, State.OK),
+        (DEFAULT_AGENT_PERF_LEVELS, 45.0, State.WARN),
+        (DEFAULT_AGENT_PERF_LEVELS, 58.0, State.CRIT),
+        ({"runtime_levels": {"warn": 100.0, "crit": 200.0}}, 58.0, State.OK),
+        ({}, 580.0, State.OK),
+    ],
+)
+def test_check_aci_agent_perf_runtime_levels(params: dict, runtime: float, expected_state: State) -> None:
+    section = SECTION._replace(runtime=runtime)
+    result = next(iter(check_aci_agent_perf(params, section)))
+
+    assert isinstance(result, Result)
+    assert result.state == expected_state
+    assert result.summary.startswith("Runtime: ")
+
+
+def test_check_aci_agent_perf_skipped_and_stale_sections() -> None:
+    section = SECTION._replace(
+        sections=[
+            *SECTION.sections,
+            SectionPerf("aci_bgp_peer_entry", "stale", 5.0, 2, 0, 0, 1, 2, "Read timed out."),
+            SectionPerf("aci_dom_pwr_stats", "skipped", 0.0, 0, 0, 0, 0, 0, "depends on aci_nodes"),
+            SectionPerf("aci_tenants", "skipped", 30.0, 3, 0, 0, 0, 0, "no result after 31.0s"),
+        ]
+    )
+    results = [result for result in check_aci_agent_perf(DEFAULT_AGENT_PERF_LEVELS, section) if isinstance(result, Result)]
+
+    assert Result(state=State.WARN, summary="Skipped sections: aci_dom_pwr_stats (depends on aci_nodes), aci_tenants (no result after 31.0s)") in results
+    assert Result(state=State.OK, summary="Stale sections: aci_bgp_peer_entry (Read timed out.)") in results
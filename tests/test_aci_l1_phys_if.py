@@ -20,7 +20,7 @@ import pytest
 from cmk.agent_based.v2 import Metric, Result, State
 from freezegun import freeze_time
 
-from cmk_addons.plugins.cisco_aci.agent_based.aci_l1_phys_if import DEFAULT_ERROR_LEVELS, AciL1Interface, check_aci_l1_phys_if, parse_aci_l1_phys_if
+from cmk_addons.plugins.cisco_aci.agent_based.aci_l1_phys_if import DEFAULT_ERROR_LEVELS, AciL1Interface, ErrorRates, check_aci_l1_phys_if, parse_aci_l1_phys_if
 
 FCS_LEVELS = (0.01, 1.0)
 CRC_LEVELS = (1.0, 12.0)
@@ -250,3 +250,25 @@ def test_check_aci_l1_phys_if(item: str, section: Dict[str, AciL1Interface], exp
             dn = section.get("eth1/3" if item == "eth1/003" else item).dn
             mock_get.return_value = {f"cisco_aci.{dn}.crc": (timestamp, 0.0), f"cisco_aci.{dn}.fcs": (timestamp, 0.0)}
         assert tuple(check_aci_l1_phys_if(item, DEFAULT_ERROR_LEVELS, section)) == expected_check_result
+
+
+@freeze_time("2009-01-15 15:26:00")
+@pytest.mark.parametrize(
+    "previous, crc_errors, fcs_errors, expected_rates",
+    [
+        # counters which were missing (stored as zero) and show up with errors
+        ((0, 0), 120, 40, ErrorRates(crc=60.0, fcs=20.0, stomped_crc=40.0)),
+        # counters which were cleared on the switch and are missing again
+        ((120, 40), 0, 0, ErrorRates(crc=0.0, fcs=0.0, stomped_crc=0.0)),
+        # counters which were cleared on the switch and counted some errors since
+        ((120, 40), 10, 0, ErrorRates(crc=0.0, fcs=0.0, stomped_crc=0.0)),
+        ((120, 40), 240, 40, ErrorRates(crc=60.0, fcs=0.0, stomped_crc=60.0)),
+    ],
+)
+def test_calculate_error_counters(previous: Tuple[int, int], crc_errors: int, fcs_errors: int, expected_rates: ErrorRates) -> None:
+    interface = AciL1Interface.from_string_table(["topology/pod-1/node-101/sys/phys-[eth1/7]", "eth1/7", "up", "Layer3", str(crc_errors), str(fcs_errors), "up", "100G"])
+    timestamp = int((datetime.now() - timedelta(minutes=2)).timestamp())
+    value_store = {f"cisco_aci.{interface.dn}.crc": (timestamp, previous[0]), f"cisco_aci.{interface.dn}.fcs": (timestamp, previous[1])}
+
+    with patch("cmk_addons.plugins.cisco_aci.agent_based.aci_l1_phys_if.get_value_store", return_value=value_store):
+        assert interface.calculate_error_counters() == expected_rates
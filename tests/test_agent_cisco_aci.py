@@ -0,0 +1,745 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# This is free software;  you can redistribute it and/or modify it
+# under the  terms of the  GNU General Public License  as published by
+# the Free Software Foundation in version 2.  check_mk is  distributed
+# in the hope that it will be useful, but WITHOUT ANY WARRANTY;  with-
+# out even the implied warranty of  MERCHANTABILITY  or  FITNESS FOR A
+# PARTICULAR PURPOSE. See the  GNU General Public License for more de-
+# tails. You should have  received  a copy of the  GNU  General Public
+# License along with GNU Make; see the file  COPYING.  If  not,  write
+# to the Free Software Foundation, Inc., 51 Franklin St,  Fifth Floor,
+# Boston, MA 02110-1301 USA.
+
+import base64
+import contextvars
+import email.utils
+import gzip
+import io
+import json
+import operator
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import pytest
+import requests
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+
+from cmk_addons.plugins.cisco_aci.special_agents.agent_cisco_aci import (
+    AciNode,
+    Apic,
+    ConcurrencyLimiter,
+    ApicSignatureAuth,
+    ApicToken,
+    DEADLINE,
+    ContextThreadPoolExecutor,
+    DeadlineExceeded,
+    DomPwrStats,
+    ErrorCounter,
+    ImdataStream,
+    InterfaceDetails,
+    L1PhysIf,
+    OUTPUT_LOCK,
+    PiggybackWriter,
+    QueryNeed,
+    QueryPlanner,
+    ResponseRecorder,
+    RetryPolicy,
+    SectionCache,
+    SectionProfiler,
+    SectionTask,
+    SessionCache,
+    PhysIfDetails,
+    join_by_interface,
+    join_pwr_stats,
+    new_session,
+    parse_arguments,
+    remaining_time,
+    run_sections,
+)
+from cmk_addons.plugins.cisco_aci.special_agents import agent_cisco_aci
+
+LIVE_URL: str = "https://10.0.0.1/api/"
+DEAD_URL: str = "https://10.0.0.2/api/"
+
+
+def _args(tmp_path, *extra: str):
+    return parse_arguments(["-H", "10.0.0.1", "10.0.0.2", "-u", "admin", "-p", "secret", "--state-dir", str(tmp_path), *extra])
+
+
+class DeadSession(requests.Session):
+    def get(self, url, **kwargs) -> requests.Response:
+        raise requests.exceptions.ConnectionError(f"{url} is not reachable")
+
+
+class LiveSession(requests.Session):
+    def get(self, url, **kwargs) -> requests.Response:
+        response = requests.Response()
+        response.status_code = 200
+        response._content = b'{"totalCount":"1","imdata":[{"fvTenant":{"attributes":{"name":"common"}}}]}'
+        return response
+
+
+def _streamed_response(body: bytes) -> requests.Response:
+    response = requests.Response()
+    response.status_code = 200
+    response.raw = io.BytesIO(body)
+    return response
+
+
+class StreamingSession(requests.Session):
+    def get(self, url, **kwargs) -> requests.Response:
+        return _streamed_response(b'{"totalCount":"1","imdata":[{"fvTenant":{"attributes":{"name":"common"}}}]}')
+
+
+@pytest.fixture
+def cached_live_session(monkeypatch) -> None:
+    """a cached session of the live controller, logins into the dead controller fail"""
+    token = ApicToken("token", time.time(), 600)
+
+    def load(self) -> Dict[str, ApicToken]:
+        return {LIVE_URL: token}
+
+    def resume_session(self, url: str, token: ApicToken) -> Tuple[requests.Session, ApicToken]:
+        return requests.Session(), token
+
+    def login(self, url: str, *args, **kwargs) -> Tuple[requests.Session, ApicToken]:
+        raise requests.exceptions.ConnectionError(f"{url} is not reachable")
+
+    monkeypatch.setattr(SessionCache, "load", load)
+    monkeypatch.setattr(Apic, "_resume_session", resume_session)
+    monkeypatch.setattr(Apic, "_login", login)
+
+
+@pytest.mark.parametrize("load_balance", ["round-robin", "least-outstanding"])
+def test_connect_resumed_and_dead_controller(tmp_path, cached_live_session, load_balance: str) -> None:
+    apic = Apic(_args(tmp_path, "--load-balance", load_balance))
+
+    controllers: List[Tuple[str, bool]] = [(controller.url, controller.resumed) for controller in apic.controllers]
+    assert controllers == [(LIVE_URL, True)]
+
+
+def test_renew_session_does_not_block_other_requests(tmp_path, cached_live_session, monkeypatch) -> None:
+    apic = Apic(_args(tmp_path, "--load-balance", "round-robin"))
+    controller = apic.controllers[0]
+    locked_during_login: List[bool] = []
+
+    def login(self, url: str, *args, **kwargs) -> Tuple[requests.Session, ApicToken]:
+        locked_during_login.append(apic._lock.locked())
+        return controller.session, ApicToken("renewed", time.time(), 600)
+
+    monkeypatch.setattr(Apic, "_login", login)
+    monkeypatch.setattr(SessionCache, "store", lambda self, tokens: None)
+
+    apic._renew_session(controller, controller.generation)
+    apic._renew_session(controller, 0)  # renewed already, no second login
+
+    assert locked_during_login == [False]
+    assert (controller.resumed, controller.generation) == (False, 1)
+
+
+def test_fail_over_from_dead_resumed_controller(tmp_path, monkeypatch) -> None:
+    """the controller of the cached session died since the last run, the other controller takes over"""
+    tokens: Dict[str, ApicToken] = {DEAD_URL: ApicToken("token", time.time(), 600)}
+
+    def login(self, url: str, *args, **kwargs) -> Tuple[requests.Session, ApicToken]:
+        if url == DEAD_URL:
+            raise requests.exceptions.ConnectionError(f"{url} is not reachable")
+        return LiveSession(), ApicToken("new", time.time(), 600)
+
+    monkeypatch.setattr(SessionCache, "load", lambda self: dict(tokens))
+    monkeypatch.setattr(SessionCache, "store", lambda self, stored: tokens.clear() or tokens.update(stored))
+    monkeypatch.setattr(Apic, "_resume_session", lambda self, url, token: (DeadSession(), token))
+    monkeypatch.setattr(Apic, "_login", login)
+
+    apic = Apic(_args(tmp_path))
+    assert [controller.url for controller in apic.controllers] == [DEAD_URL]
+
+    assert apic.get_imdata("class/fvTenant.json") == [{"fvTenant": {"attributes": {"name": "common"}}}]
+    assert [(controller.url, controller.resumed) for controller in apic.controllers] == [(LIVE_URL, False)]
+    assert list(tokens) == [LIVE_URL]
+
+
+IMDATA_BODY: bytes = (
+    b'{"totalCount":"3","imdata":[\n'
+    b'{"faultInst":{"attributes":{"dn":"topology/pod-1/node-101/fault-F1","descr":"braces {} and \\"quotes\\" in a string"}}},\n'
+    b'{"faultInst":{"attributes":{"dn":"topology/pod-1/node-102/fault-F2","descr":"non-ascii \xc3\xa4\xc3\xb6\xc3\xbc"}}} ,\n'
+    b'{"faultInst":{"attributes":{"dn":"topology/pod-1/node-103/fault-F3","descr":""}}}\n'
+    b"]}"
+)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 7, 64, 4096])
+def test_imdata_stream_chunk_boundaries(chunk_size: int) -> None:
+    stream = ImdataStream(_streamed_response(IMDATA_BODY), chunk_size=chunk_size)
+
+    assert list(stream) == json.loads(IMDATA_BODY)["imdata"]
+    assert stream.total_count == 3
+
+
+@pytest.mark.parametrize(
+    "body, total_count",
+    [
+        (b'{"totalCount":"2","imdata":[{"a":{}},{"b":{}}]}', 2),
+        (b'{"imdata":[{"a":{}},{"b":{}}],"totalCount":"2"}', 2),
+        (b'{"totalCount": 12, "imdata": []}', 12),
+        (b'{"imdata":[]}', 0),
+    ],
+)
+def test_imdata_stream_total_count(body: bytes, total_count: int) -> None:
+    stream = ImdataStream(_streamed_response(body), chunk_size=3)
+
+    assert len(list(stream)) == len(json.loads(body)["imdata"])
+    assert stream.total_count == total_count
+
+
+def test_imdata_stream_error_object() -> None:
+    body = b'{"totalCount":"1","imdata":[{"error":{"attributes":{"code":"400","text":"Unable to process the query, result dataset is too big"}}}]}'
+
+    assert list(ImdataStream(_streamed_response(body), chunk_size=5)) == [{"error": {"attributes": {"code": "400", "text": "Unable to process the query, result dataset is too big"}}}]
+
+
+@pytest.mark.parametrize("body", [b'{"totalCount":"1","imdata":[{"a":{}}', b'{"totalCount":"1","imdata":[{"a":{', b'{"error":"no imdata"}'])
+def test_imdata_stream_incomplete_response(body: bytes) -> None:
+    with pytest.raises(ValueError):
+        list(ImdataStream(_streamed_response(body), chunk_size=4))
+
+
+def test_streamed_response_holds_concurrency_slot(tmp_path, cached_live_session) -> None:
+    apic = Apic(_args(tmp_path))
+    apic.controllers[0].session = StreamingSession()
+
+    stream = ImdataStream(apic._get("class/fvTenant.json", stream=True))
+    assert apic.concurrency._in_flight == 1
+
+    assert list(stream) == [{"fvTenant": {"attributes": {"name": "common"}}}]
+    assert apic.concurrency._in_flight == 0
+
+
+class ResetBody(io.BytesIO):
+    """a body whose connection is reset after the first read"""
+
+    def read(self, *args) -> bytes:
+        if self.tell() > 0:
+            raise requests.exceptions.ChunkedEncodingError("Connection broken: ConnectionResetError(104, 'Connection reset by peer')")
+        return super().read(*args)
+
+
+class FlakySession(requests.Session):
+    """the connection of the first response is reset while its body is read"""
+
+    def __init__(self, stream_reset: bool = False) -> None:
+        super().__init__()
+        self.stream_reset = stream_reset
+        self.requests = 0
+
+    def get(self, url, stream: bool = False, **kwargs) -> requests.Response:
+        self.requests += 1
+        body = b'{"totalCount":"1","imdata":[{"fvTenant":{"attributes":{"name":"common"}}}]}'
+        if self.requests > 1:
+            return _streamed_response(body)
+        if not stream:
+            raise requests.exceptions.ChunkedEncodingError("Connection broken: IncompleteRead(10 bytes read)")
+        response = _streamed_response(body)
+        response.raw = ResetBody(body)
+        return response
+
+
+@pytest.mark.parametrize("stream_json", [False, True])
+def test_connection_reset_while_reading_body_is_retried(tmp_path, cached_live_session, stream_json: bool) -> None:
+    apic = Apic(_args(tmp_path, *(["--stream-json"] if stream_json else [])))
+    apic.retry.backoff = 0.01
+    session = apic.controllers[0].session = FlakySession()
+
+    assert apic.get_data_from_class("fvTenant") == [{"name": "common"}]
+    assert session.requests == 2
+    assert apic.concurrency._in_flight == 0
+
+
+class TimeoutSession(requests.Session):
+    def get(self, url, **kwargs) -> requests.Response:
+        raise requests.exceptions.ReadTimeout(f"{url} did not answer within {kwargs['timeout']:.1f}s")
+
+
+@pytest.mark.parametrize("budget, limit", [(None, 2), (30.0, 4)])
+def test_only_full_request_timeout_is_congestion(tmp_path, cached_live_session, budget: Optional[float], limit: int) -> None:
+    apic = Apic(_args(tmp_path, "--max-retries", "0"))
+    apic.controllers[0].session = TimeoutSession()
+
+    def get() -> None:
+        if budget is not None:
+            DEADLINE.set(time.monotonic() + budget)
+        apic.get_imdata("class/fvTenant.json")
+
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        contextvars.copy_context().run(get)
+    assert apic.concurrency.limit == limit
+
+
+def test_race_login_does_not_wait_for_losers(tmp_path, monkeypatch) -> None:
+    """the login into the slow controller is still running when the agent is done, it must not keep it alive"""
+    slow_login_running = threading.Event()
+
+    def login(self, url: str, *args, **kwargs) -> Tuple[requests.Session, ApicToken]:
+        if url == LIVE_URL:
+            slow_login_running.set()
+            time.sleep(2)
+        return LiveSession(), ApicToken(url, time.time(), 600)
+
+    monkeypatch.setattr(Apic, "_login", login)
+    monkeypatch.setattr(Apic, "_logout", lambda self, url, session: None)
+
+    apic = Apic(_args(tmp_path, "--no-session-cache"))
+
+    assert [controller.url for controller in apic.controllers] == [DEAD_URL]
+    assert slow_login_running.is_set()
+    assert [thread.name for thread in threading.enumerate() if thread.is_alive() and not thread.daemon] == [threading.main_thread().name]
+
+
+def test_section_cache_restores_models(tmp_path) -> None:
+    data = {
+        "versions": [("topology/pod-1/node-1", "5.2(1g)")],
+        "nodes": {"node-101": [AciNode(name="leaf101", role="leaf", state="in-service", serial="SAL1", node_id="101")]},
+        "interfaces": {"node-101": [InterfaceDetails("dn", "eth1/1", "up", "layer2", "0", "0", "up", "10G")]},
+        "dom": {"node-101": [DomPwrStats.get_pwr_stats({"dn": "dn/domstats/rxpower", "value": "-2.1"}, {"value": "-1.9"})]},
+    }
+    cache = SectionCache(str(tmp_path / "state"), ["10.0.0.1"])
+    cache.store("all", 1.0, data)
+
+    assert cache.load("all", ttl=int(time.time())) == (1.0, data)
+    assert not list((tmp_path / "state").glob("*.pickle"))
+
+
+def test_section_cache_ignores_shared_state_dir(tmp_path) -> None:
+    state_dir = tmp_path / "shared"
+    state_dir.mkdir()
+    os.chmod(state_dir, 0o777)
+    cache = SectionCache(str(state_dir), ["10.0.0.1"])
+    cache.store("nodes", time.time(), [])
+
+    assert not list(state_dir.iterdir())
+    assert cache.load("nodes", ttl=60) is None
+
+
+def _work_in_worker_thread() -> int:
+    return sum(range(1000))
+
+
+def test_section_profile_covers_worker_threads(tmp_path) -> None:
+    def fetch() -> List[int]:
+        with ContextThreadPoolExecutor(max_workers=2) as executor:
+            return list(executor.map(lambda _: _work_in_worker_thread(), range(2)))
+
+    profiler = SectionProfiler(str(tmp_path), None)
+    assert profiler.profiled("aci_nodes", "fetch", fetch)() == [499500, 499500]
+    profiler.close()
+
+    assert "_work_in_worker_thread" in (tmp_path / "aci_nodes.txt").read_text()
+
+
+PIGGYBACK_SECTIONS: Dict[str, str] = {"aci_l1_phys_if": "dn|id", "aci_dom_pwr_stats": "dn|rx|tx"}
+
+
+def _piggyback_blocks(output: str) -> List[Tuple[str, List[str]]]:
+    """the piggyback blocks in the agent output as (host, lines), with an empty host for the lines outside of blocks"""
+    blocks: List[Tuple[str, List[str]]] = [("", [])]
+    for line in output.splitlines():
+        if line == "<<<<>>>>":
+            blocks.append(("", []))
+        elif line.startswith("<<<<"):
+            blocks.append((line.strip("<>"), []))
+        else:
+            blocks[-1][1].append(line)
+    return [block for block in blocks if block[0] or block[1]]
+
+
+def test_piggyback_writer_order(capsys) -> None:
+    with PiggybackWriter(PIGGYBACK_SECTIONS, "example.com") as writer:
+        writer.put("aci_l1_phys_if", {"leaf101": ["dn1|eth1/1"]})
+        writer.put("aci_dom_pwr_stats", {"leaf102": ["dn2|-2|-3"]})
+        writer.put("aci_dom_pwr_stats", {"leaf101": ["dn1|-1|-2"]})  # leaf101 is complete
+        writer.done("aci_dom_pwr_stats")
+        writer.put("aci_l1_phys_if", {"leaf102": ["dn2|eth1/2"], "leaf101": ["dn1|put again"]})
+        writer.put("aci_l1_phys_if", {"spine201": ["dn3|eth1/3"]})
+        writer.done("aci_l1_phys_if")
+
+    assert _piggyback_blocks(capsys.readouterr().out) == [
+        ("leaf101.example.com", ["<<<aci_l1_phys_if:sep(124)>>>", "dn|id", "dn1|eth1/1", "<<<aci_dom_pwr_stats:sep(124)>>>", "dn|rx|tx", "dn1|-1|-2"]),
+        ("leaf102.example.com", ["<<<aci_l1_phys_if:sep(124)>>>", "dn|id", "dn2|eth1/2", "<<<aci_dom_pwr_stats:sep(124)>>>", "dn|rx|tx", "dn2|-2|-3"]),
+        ("spine201.example.com", ["<<<aci_l1_phys_if:sep(124)>>>", "dn|id", "dn3|eth1/3"]),
+    ]
+    assert writer.blocks_written == 3
+
+
+def test_piggyback_writer_blocks_are_not_interleaved(capsys) -> None:
+    nodes: List[str] = [f"leaf{number}" for number in range(100, 150)]
+
+    def put_rows(writer: PiggybackWriter, section: str) -> None:
+        for node in nodes:
+            writer.put(section, {node: [f"{node}|{section}"]})
+        writer.done(section)
+
+    with PiggybackWriter(PIGGYBACK_SECTIONS, "") as writer:
+        threads = [threading.Thread(target=put_rows, args=(writer, section)) for section in PIGGYBACK_SECTIONS]
+        for thread in threads:
+            thread.start()
+        for _ in range(20):
+            # the scheduler writes the other sections at the same time
+            with OUTPUT_LOCK:
+                print("<<<aci_nodes:sep(124)>>>")
+        for thread in threads:
+            thread.join()
+
+    blocks = _piggyback_blocks(capsys.readouterr().out)
+    assert sorted(host for host, _ in blocks if host) == nodes
+    for host, lines in blocks:
+        if host:
+            assert lines == ["<<<aci_l1_phys_if:sep(124)>>>", "dn|id", f"{host}|aci_l1_phys_if", "<<<aci_dom_pwr_stats:sep(124)>>>", "dn|rx|tx", f"{host}|aci_dom_pwr_stats"]
+        else:
+            assert set(lines) == {"<<<aci_nodes:sep(124)>>>"}
+
+
+def _iface_dn(node: int, iface: str) -> str:
+    return f"topology/pod-1/node-{node}/sys/phys-[{iface}]"
+
+
+def test_join_interfaces_with_missing_details_and_counters() -> None:
+    interfaces = [L1PhysIf(_iface_dn(101, "eth1/1"), "eth1/1", "up", "layer2"), L1PhysIf(_iface_dn(101, "eth1/2"), "eth1/2", "down", "layer3"), L1PhysIf(_iface_dn(102, "eth1/1"), "eth1/1", "up", "layer2")]
+    ether_stats = [ErrorCounter(f"{_iface_dn(101, 'eth1/1')}/dbgEtherStats", "5"), ErrorCounter(f"{_iface_dn(102, 'eth1/1')}/dbgEtherStats", None)]
+    dot3_stats = [ErrorCounter(f"{_iface_dn(101, 'eth1/1')}/dbgDot3Stats", "7"), ErrorCounter("topology/pod-1/node-101/sys/ch/dbgDot3Stats", "9")]
+    details = [PhysIfDetails(f"{_iface_dn(101, 'eth1/2')}/phys", "down", "inherit")]
+
+    joined = list(join_by_interface(interfaces, ether_stats, dot3_stats, details, dn=operator.attrgetter("dn")))
+
+    assert joined == [
+        (interfaces[0], ether_stats[0], dot3_stats[0], None),
+        (interfaces[1], None, None, details[0]),
+        (interfaces[2], ether_stats[1], None, None),
+    ]
+    assert [InterfaceDetails.get_interface_details(*interface, missing_counter="0")[4:] for interface in joined] == [
+        ("5", "7", None, None),
+        ("0", "0", "down", "inherit"),
+        ("0", "0", None, None),
+    ]
+
+
+def test_join_pwr_stats_without_tx_stats() -> None:
+    rx_stats = [{"dn": f"{_iface_dn(101, 'eth1/49')}/phys/domstats/rxpower", "value": "-2.5"}, {"dn": f"{_iface_dn(101, 'eth1/50')}/phys/domstats/rxpower", "value": "-3.5"}]
+    tx_stats = [{"dn": f"{_iface_dn(101, 'eth1/50')}/phys/domstats/txpower", "value": "-1.5"}]
+
+    stats = [DomPwrStats.get_pwr_stats(rx, tx) for rx, tx in join_pwr_stats(rx_stats, tx_stats)]
+
+    assert [(stat.dn, stat.rx.value, stat.tx.value) for stat in stats] == [
+        (f"{_iface_dn(101, 'eth1/49')}/phys", "-2.5", "n/a"),
+        (f"{_iface_dn(101, 'eth1/50')}/phys", "-3.5", "-1.5"),
+    ]
+
+
+class SlowImdataApic:
+    """answers every query (within the deadline) after `delay` seconds with a fabricHealthTotal and a topSystem object"""
+
+    def __init__(self, delay: float = 0.0) -> None:
+        self.delay = delay
+        self.queries: List[str] = []
+
+    def get_imdata(self, endpoint: str) -> List[Dict]:
+        self.queries.append(endpoint)
+        time.sleep(self.delay)
+        remaining_time()  # like a request, fails once the deadline is over
+        return [{"fabricHealthTotal": {"attributes": {"cur": "95"}}}, {"topSystem": {"attributes": {"name": "leaf101"}}}]
+
+
+QUERY_NEEDS: Dict[str, QueryNeed] = {
+    "aci_health": QueryNeed(("fabricHealthTotal",)),
+    "aci_nodes": QueryNeed(("topSystem",), children=("eqptCh",), include=("health",)),
+}
+
+
+def test_query_planner_leaves_out_unplanned_sections() -> None:
+    apic = SlowImdataApic()
+    planner = QueryPlanner(apic, QUERY_NEEDS)
+    planner.plan(["aci_health"])  # aci_nodes is taken from the section cache
+
+    assert planner.get("aci_health") == {"fabricHealthTotal": [{"fabricHealthTotal": {"attributes": {"cur": "95"}}}]}
+    assert apic.queries == ["node/mo/topology.json?query-target=subtree&target-subtree-class=fabricHealthTotal"]
+    with pytest.raises(ValueError):
+        planner.get("aci_nodes")
+
+
+def test_query_planner_budget_of_first_section_does_not_fail_others() -> None:
+    planner = QueryPlanner(SlowImdataApic(delay=0.3), QUERY_NEEDS)
+
+    def get_with_budget(section: str, budget: float) -> Dict[str, List[Dict]]:
+        DEADLINE.set(time.monotonic() + budget)
+        return planner.get(section)
+
+    with pytest.raises(DeadlineExceeded):
+        contextvars.copy_context().run(get_with_budget, "aci_health", 0.05)  # sends the query
+    assert contextvars.copy_context().run(get_with_budget, "aci_nodes", 5) == {"topSystem": [{"topSystem": {"attributes": {"name": "leaf101"}}}]}
+
+
+class Sections:
+    """stub section tasks, which record the order their sections are written in"""
+
+    def __init__(self) -> None:
+        self.written: List[Tuple[str, object]] = []
+
+    def task(self, name: str, fetch: Callable[..., object], **kwargs) -> SectionTask:
+        def write(data: object) -> None:
+            print(f"<<<{name}:sep(124)>>>")
+            self.written.append((name, data))
+
+        return SectionTask(name, fetch=fetch, write=write, **kwargs)
+
+
+def _after(seconds: float, result: object) -> Callable[..., object]:
+    def fetch(*dependencies: object) -> object:
+        time.sleep(seconds)
+        return result
+
+    return fetch
+
+
+def _raise(error: Exception) -> Callable[..., object]:
+    def fetch(*dependencies: object) -> object:
+        raise error
+
+    return fetch
+
+
+def test_run_sections_writes_in_task_order() -> None:
+    sections = Sections()
+    tasks = [
+        sections.task("aci_version", _after(0.2, "slow")),
+        sections.task("aci_nodes", _after(0.0, "fast")),
+        sections.task("aci_l1_phys_if", lambda nodes: f"interfaces of {nodes}", depends_on=("aci_nodes",)),
+    ]
+
+    statuses = run_sections(tasks, max_workers=4)
+
+    assert sections.written == [("aci_version", "slow"), ("aci_nodes", "fast"), ("aci_l1_phys_if", "interfaces of fast")]
+    assert [status.state for status in statuses] == ["ok", "ok", "ok"]
+
+
+def test_run_sections_skips_dependent_of_failed_section() -> None:
+    sections = Sections()
+    tasks = [
+        sections.task("aci_nodes", _raise(requests.exceptions.ReadTimeout("Read timed out."))),
+        sections.task("aci_l1_phys_if", _after(0.0, []), depends_on=("aci_nodes",)),
+        sections.task("aci_tenants", _after(0.0, ["common"])),
+    ]
+
+    statuses = run_sections(tasks, max_workers=4)
+
+    assert sections.written == [("aci_tenants", ["common"])]
+    assert [(status.state, status.detail) for status in statuses] == [("skipped", "Read timed out."), ("skipped", "depends on aci_nodes"), ("ok", "")]
+
+
+def test_run_sections_raises_error_without_stale_max_age() -> None:
+    sections = Sections()
+    tasks = [sections.task("aci_nodes", _raise(KeyError("topSystem"))), sections.task("aci_tenants", _after(0.0, []))]
+
+    with pytest.raises(KeyError):
+        run_sections(tasks, max_workers=4)
+
+
+def test_run_sections_writes_stale_result_with_its_age(tmp_path, capsys) -> None:
+    section_cache = SectionCache(str(tmp_path), ["10.0.0.1"])
+    fetched_at = time.time() - 300
+    section_cache.store("aci_nodes", fetched_at, ["leaf101"])
+    sections = Sections()
+
+    statuses = run_sections([sections.task("aci_nodes", _raise(KeyError("topSystem")))], max_workers=4, section_cache=section_cache, stale_max_age=600)
+
+    assert sections.written == [("aci_nodes", ["leaf101"])]
+    assert capsys.readouterr().out == f"<<<aci_nodes:cached({int(fetched_at)},600):sep(124)>>>\n"
+    assert [(status.state, status.detail) for status in statuses] == [("stale", "'topSystem'")]
+
+
+def test_run_sections_abandons_fetcher_after_deadline(monkeypatch) -> None:
+    monkeypatch.setattr(agent_cisco_aci, "DEADLINE_GRACE", 0.1)
+    release = threading.Event()
+    sections = Sections()
+    tasks = [
+        sections.task("aci_nodes", lambda: release.wait(5), budget=0.1),
+        sections.task("aci_tenants", _after(0.0, [])),
+    ]
+
+    start = time.monotonic()
+    try:
+        statuses = run_sections(tasks, max_workers=4)
+    finally:
+        release.set()
+
+    assert time.monotonic() - start < 1
+    assert sections.written == [("aci_tenants", [])]
+    assert statuses[0].state == "skipped"
+    assert statuses[0].detail.startswith("no result after")
+
+
+def _retry_after(value: str) -> requests.Response:
+    response = requests.Response()
+    response.status_code = 503
+    response.headers["Retry-After"] = value
+    return response
+
+
+def test_retry_after_seconds_and_http_date() -> None:
+    policy = RetryPolicy()
+    in_20_seconds = email.utils.formatdate(time.time() + 20, usegmt=True)
+
+    assert policy.delay("GET", 0, 0.0, _retry_after("7")) == 7.0
+    assert 18 <= policy.delay("GET", 0, 0.0, _retry_after(in_20_seconds)) <= 20
+    assert policy.delay("GET", 0, 0.0, _retry_after(email.utils.formatdate(time.time() - 60, usegmt=True))) == 0.0
+
+
+def test_retry_delay_within_max_time() -> None:
+    policy = RetryPolicy(max_time=10.0)
+
+    assert policy.delay("GET", 1, 4.0, _retry_after("5")) == 5.0
+    assert policy.delay("GET", 2, 9.0, _retry_after("5")) is None
+
+
+def test_no_retry_past_deadline() -> None:
+    def delay(retry_after: str) -> Optional[float]:
+        DEADLINE.set(time.monotonic() + 3)
+        return RetryPolicy().delay("GET", 0, 0.0, _retry_after(retry_after))
+
+    assert contextvars.copy_context().run(delay, "1") == 1.0
+    assert contextvars.copy_context().run(delay, "5") is None
+
+
+@pytest.mark.parametrize("method, attempt, expected", [("GET", 0, 1.0), ("POST", 0, None), ("DELETE", 0, None), ("GET", 3, None)])
+def test_retry_only_idempotent_methods_and_retries(method: str, attempt: int, expected: Optional[float]) -> None:
+    assert RetryPolicy(retries=3).delay(method, attempt, 0.0, _retry_after("1")) == expected
+
+
+@pytest.mark.parametrize("attempt, low, high", [(0, 0.25, 0.5), (1, 0.5, 1.0), (2, 1.0, 2.0), (10, 5.0, 10.0)])
+def test_retry_equal_jitter_bounds(attempt: int, low: float, high: float) -> None:
+    policy = RetryPolicy(retries=20, backoff=0.5, max_delay=10.0, max_time=1000.0)
+    delays = [policy.delay("GET", attempt, 0.0) for _ in range(200)]
+
+    assert all(low <= delay <= high for delay in delays)
+    assert max(delays) - min(delays) > (high - low) / 2  # spread, not a fixed delay
+
+
+def test_concurrency_slow_start_and_additive_increase() -> None:
+    limiter = ConcurrencyLimiter(initial=4, maximum=50)
+    for _ in range(4):
+        limiter.record(limiter.acquire(), "class/#", 0.1)
+        limiter.release()
+    assert limiter.limit == 8  # doubled within one window
+
+    limiter.record(limiter._epoch, "class/#", 0.1, congested=True)
+    assert (limiter.limit, limiter.decreases) == (4, 1)
+
+    for _ in range(3):
+        limiter.record(limiter._epoch, "class/#", 0.1)
+    assert limiter.limit == 4
+    limiter.record(limiter._epoch, "class/#", 0.1)
+    assert limiter.limit == 5  # one more after a window of `limit` requests
+    assert limiter.peak == 8
+
+
+def test_concurrency_decrease_on_rising_latency() -> None:
+    limiter = ConcurrencyLimiter(initial=8, maximum=8)
+    for _ in range(5):
+        limiter.record(limiter._epoch, "class/#", 0.1)
+    assert limiter.limit == 8
+
+    limiter.record(limiter._epoch, "class/#", 0.5)  # a single slow request is smoothed out
+    assert limiter.limit == 8
+    limiter.record(limiter._epoch, "class/#", 0.5)
+    assert (limiter.limit, limiter.decreases) == (4, 1)
+
+
+def test_concurrency_decreases_once_per_epoch() -> None:
+    limiter = ConcurrencyLimiter(initial=8, maximum=8)
+    epochs = [limiter.acquire() for _ in range(3)]
+
+    for epoch in epochs:
+        # all requests in flight during the congestion report it
+        limiter.record(epoch, "class/#", 5.0, congested=True)
+        limiter.release()
+
+    assert (limiter.limit, limiter.decreases) == (4, 1)
+    limiter.record(limiter.acquire(), "class/#", 5.0, congested=True)
+    assert (limiter.limit, limiter.decreases) == (2, 2)
+
+
+class StatusSession(requests.Session):
+    def __init__(self, status: int) -> None:
+        super().__init__()
+        self.status = status
+
+    def get(self, url, **kwargs) -> requests.Response:
+        response = requests.Response()
+        response.status_code = self.status
+        response._content = b'{"totalCount":"0","imdata":[]}'
+        return response
+
+
+@pytest.mark.parametrize("status, limit", [(429, 2), (503, 2), (500, 5), (200, 5)])
+def test_concurrency_halved_on_throttling_status(tmp_path, cached_live_session, status: int, limit: int) -> None:
+    apic = Apic(_args(tmp_path, "--max-retries", "0"))
+    apic.concurrency = ConcurrencyLimiter(initial=4, maximum=5)
+    apic.controllers[0].session = StatusSession(status)
+
+    try:
+        apic.get_imdata("class/fvTenant.json")
+    except requests.HTTPError:
+        pass
+    assert apic.concurrency.limit == limit
+
+
+@pytest.mark.parametrize(
+    "method, url, body, payload",
+    [
+        ("GET", "https://10.0.0.1/api/class/fvTenant.json?rsp-subtree-include=health&page=0", None, b"GET/api/class/fvTenant.json?rsp-subtree-include=health&page=0"),
+        ("POST", "https://10.0.0.1/api/aaaRefresh.json", b'{"a":1}', b'POST/api/aaaRefresh.json{"a":1}'),
+    ],
+)
+def test_signature_auth_signs_method_path_query_and_body(tmp_path, method: str, url: str, body: Optional[bytes], payload: bytes) -> None:
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    key_file = tmp_path / "admin.key"
+    key_file.write_bytes(private_key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()))
+
+    request = requests.Request(method, url, data=body).prepare()
+    ApicSignatureAuth("admin", "monitoring", str(key_file))(request)
+
+    cookies = dict(cookie.split("=", 1) for cookie in request.headers["Cookie"].split("; "))
+    assert set(cookies) == {"APIC-Request-Signature", "APIC-Certificate-Algorithm", "APIC-Certificate-Fingerprint", "APIC-Certificate-DN"}
+    assert cookies["APIC-Certificate-Algorithm"] == "v1.0"
+    assert cookies["APIC-Certificate-Fingerprint"] == "fingerprint"
+    assert cookies["APIC-Certificate-DN"] == "uni/userext/user-admin/usercert-monitoring"
+    # raises InvalidSignature if anything else than the payload was signed
+    private_key.public_key().verify(base64.b64decode(cookies["APIC-Request-Signature"]), payload, padding.PKCS1v15(), hashes.SHA256())
+
+
+def test_recorder_scrubs_session_secrets(tmp_path, monkeypatch) -> None:
+    body = (
+        b'{"totalCount":"1","imdata":[{"aaaLogin":{"attributes":{"token":"eyJhbGciOiJSUzI1NiIsImtpZCI6IjEyMyJ9",'
+        b'"refreshTimeoutSeconds":"600","sessionId" : "k4bPNmYzQ2ltJAN1cjVxhQ==","userName":"admin"}}}]}'
+    )
+
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        response = requests.Response()
+        response.status_code = 200
+        response.headers["Set-Cookie"] = "APIC-cookie=eyJhbGciOiJSUzI1NiIsImtpZCI6IjEyMyJ9; path=/; secure"
+        response._content = body
+        response.request, response.url = request, request.url
+        return response
+
+    monkeypatch.setattr(requests.adapters.HTTPAdapter, "send", send)
+    record_dir = tmp_path / "record"
+    session = new_session(4, recorder=ResponseRecorder(str(record_dir)))
+    session.post("https://10.0.0.1/api/aaaLogin.json", json={"aaaUser": {"attributes": {"name": "admin", "pwd": "s3cr3t-pwd"}}})
+
+    recorded = gzip.decompress((record_dir / "00001.json.gz").read_bytes()) + (record_dir / "requests.jsonl").read_bytes()
+    for secret in (b"eyJhbGciOiJSUzI1NiIsImtpZCI6IjEyMyJ9", b"k4bPNmYzQ2ltJAN1cjVxhQ==", b"s3cr3t-pwd"):
+        assert secret not in recorded
+    assert json.loads(gzip.decompress((record_dir / "00001.json.gz").read_bytes()))["imdata"][0]["aaaLogin"]["attributes"]["userName"] == "admin"